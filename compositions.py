@@ -0,0 +1,205 @@
+"""Composition Index
+
+This file contains methods to build and query a compact signature for every board (one player in one match), so comp lookups don't need self-joins on player_units / player_traits.
+
+A signature is a sorted array of integer ids from the composition_keys table:
+    * unit:<character_id>:<star> for every star level the unit reached, so a 3 star unit also matches 1 and 2 star lookups.
+    * trait:<name>:<tier> for every tier an active trait reached, so a tier 2 trait also matches tier 1 lookups.
+The signature column is GIN indexed so containment (@>) lookups stay fast as board_compositions grows.
+
+Methods:
+--------
+    * unit_key - Returns the composition key for a unit at a star level.
+    * trait_key - Returns the composition key for a trait at a tier.
+    * get_board_keys - Returns the placement and composition keys of every board in a match.
+    * get_key_ids - Upserts composition keys into composition_keys and returns their ids, composition_keys must exist.
+    * get_board_compositions - Returns a pd.DataFrame() of board signatures for a batch of matches.
+    * find_boards - Returns boards whose signature contains every required unit and trait.
+"""
+
+import pandas as pd
+import psycopg2.errors
+import psycopg2.extras
+
+from db import DB, ensure_table
+from config import get_database_creds
+from etl_utils import list_to_sql_values
+from records import MatchRecord
+
+# Cache of key_name: key_id so repeat loads only round trip for keys not seen before.
+_key_ids = {}
+
+def unit_key(character_id: str, star: int = 1) -> str:
+    """Returns the composition key for a unit at a star level.
+
+    Parameters
+    ----------
+    * character_id: str
+        The unit character_id e.g. 'TFT5_Garen'.
+    * star: int
+        The unit star level.
+
+    Returns
+    -------
+    * str
+        A composition key.
+    """
+
+    return f'unit:{character_id}:{star}'
+
+def trait_key(name: str, tier: int = 1) -> str:
+    """Returns the composition key for a trait at a tier.
+
+    Parameters
+    ----------
+    * name: str
+        The trait name e.g. 'Set5_Knight'.
+    * tier: int
+        The active trait tier.
+
+    Returns
+    -------
+    * str
+        A composition key.
+    """
+
+    return f'trait:{name}:{tier}'
+
+def get_board_keys(match_data: MatchRecord) -> dict:
+    """Returns the placement and composition keys of every board in a match.
+
+    Parameters
+    ----------
+    * match_data: MatchRecord
+        Match data decoded by decode_match.
+
+    Returns
+    -------
+    * dict
+        A dictionary consisting of key value pair puuid: (placement, set of composition keys).
+    """
+
+    boards = {}
+    for participant in match_data.participants:
+        keys = set()
+        for unit in participant.units:
+            keys.update(unit_key(unit.character_id, star) for star in range(1, unit.tier + 1))
+        for trait in participant.traits:
+            keys.update(trait_key(trait.name, tier) for tier in range(1, trait.tier_current + 1))
+        boards[participant.puuid] = (participant.placement, keys)
+
+    return boards
+
+def get_key_ids(cur, key_names) -> dict:
+    """Upserts composition keys into composition_keys and returns their ids.
+
+    Parameters
+    ----------
+    * cur: psycopg2.connect.cursor()
+        A psycopg2 Cursor object.
+    * key_names: iterable
+        Composition keys.
+
+    Returns
+    -------
+    * dict
+        A dictionary consisting of key value pair key_name: key_id.
+    """
+
+    # Sorted so concurrent loads insert overlapping new keys in the same order and can't deadlock on each other's rows.
+    missing = sorted(key_name for key_name in set(key_names) if key_name not in _key_ids)
+
+    if missing:
+        psycopg2.extras.execute_values(
+            cur,
+            "INSERT INTO composition_keys (key_name) VALUES %s ON CONFLICT (key_name) DO NOTHING",
+            [(key_name,) for key_name in missing]
+        )
+        cur.execute("SELECT key_name, key_id FROM composition_keys WHERE key_name = ANY(%s)", (missing,))
+        _key_ids.update(cur.fetchall())
+
+    return {key_name: _key_ids[key_name] for key_name in key_names}
+
+def get_board_compositions(match_data_dict: dict) -> pd.DataFrame():
+    """Returns a pd.DataFrame() of board signatures for a batch of matches.
+
+    Parameters
+    ----------
+    * match_data_dict: dict
+        A dictionary consisting of key value pair match_id: MatchRecord returned by get_match_data.
+
+    Returns
+    -------
+    * pd.DataFrame()
+        A Pandas DataFrame with columns puuid, match_id, placement and signature.
+    """
+
+    boards = [
+        (puuid, match_id, placement, keys)
+        for match_id, match_data in match_data_dict.items()
+        for puuid, (placement, keys) in get_board_keys(match_data).items()
+    ]
+
+    with DB(**get_database_creds()).managed_cursor() as cur:
+        # composition_keys is created with board_compositions, and must exist before keys are assigned ids.
+        ensure_table(cur, 'board_compositions')
+        key_ids = get_key_ids(cur, set().union(*(keys for *_, keys in boards)))
+
+    rows = [
+        (puuid, match_id, placement, list_to_sql_values([str(key_id) for key_id in sorted(key_ids[key] for key in keys)]))
+        for puuid, match_id, placement, keys in boards
+    ]
+
+    return pd.DataFrame(rows, columns=['puuid', 'match_id', 'placement', 'signature'])
+
+def find_boards(units=None, traits=None, limit: int = None) -> pd.DataFrame():
+    """Returns boards whose signature contains every required unit and trait, best placement first.
+
+    Parameters
+    ----------
+    * units: dict or iterable
+        Required units as character_id: minimum star level, or an iterable of character_id's for any star level.
+    * traits: dict or iterable
+        Required traits as name: minimum tier, or an iterable of trait names for any active tier.
+    * limit: int
+        Maximum number of boards returned, all boards if None.
+
+    Returns
+    -------
+    * pd.DataFrame()
+        A Pandas DataFrame with columns puuid, match_id and placement.
+    """
+
+    units = units if isinstance(units, dict) else dict.fromkeys(units or (), 1)
+    traits = traits if isinstance(traits, dict) else dict.fromkeys(traits or (), 1)
+
+    required = [unit_key(character_id, star) for character_id, star in units.items()]
+    required += [trait_key(name, tier) for name, tier in traits.items()]
+
+    columns = ['puuid', 'match_id', 'placement']
+
+    with DB(**get_database_creds()).managed_cursor() as cur:
+        try:
+            cur.execute("SELECT key_name, key_id FROM composition_keys WHERE key_name = ANY(%s)", (required,))
+        except psycopg2.errors.UndefinedTable:
+            # Nothing has been loaded yet.
+            return pd.DataFrame(columns=columns)
+        key_ids = dict(cur.fetchall())
+
+        # A key never seen during load can't be on any board.
+        if len(key_ids) < len(set(required)):
+            return pd.DataFrame(columns=columns)
+
+        cur.execute(
+            """
+            SELECT puuid, match_id, placement
+            FROM board_compositions
+            WHERE signature @> %s::INTEGER[]
+            ORDER BY placement
+            LIMIT %s
+            """,
+            (sorted(key_ids.values()), limit)
+        )
+        boards = cur.fetchall()
+
+    return pd.DataFrame(boards, columns=columns)
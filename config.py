@@ -6,6 +6,7 @@ Methods:
 --------
     * get_database_creds - Returns a dictionary with DB credentials.
     * get_api_key - Returns a str with Riot API key.
+    * get_tracked_puuids - Returns a list of puuids to follow alongside the challenger ladder.
 """
 
 import os
@@ -31,14 +32,33 @@ def get_database_creds() -> dict:
         'port': int(os.environ.get('DB_PORT'))
     }
 
-def get_api_key() -> str:
+def get_api_key(env_var: str = 'API_KEY') -> str:
     """Gets Riot API key as a str.
 
+    Parameters:
+    -----------
+    * env_var: str
+        Environment variable holding the key, so each crawl worker can run with its own key.
+
     Returns:
     --------
     * str
         Riot API key.
     """
 
-    riot_api_key = os.environ.get('API_KEY')
+    riot_api_key = os.environ.get(env_var)
     return riot_api_key
+
+def get_tracked_puuids() -> list:
+    """Gets puuids to follow alongside the challenger ladder as a list.
+
+    * Read from the comma separated TRACKED_PUUIDS environment variable.
+
+    Returns:
+    --------
+    * list
+        Tracked player puuids.
+    """
+
+    tracked_puuids = os.environ.get('TRACKED_PUUIDS', '')
+    return [puuid.strip() for puuid in tracked_puuids.split(',') if puuid.strip()]
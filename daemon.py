@@ -0,0 +1,234 @@
+"""Ingestion Daemon
+
+This file contains a long running service mode for the ETL pipeline.
+
+* The challenger ladder and tracked players are polled continuously instead of once per script run.
+* Every Riot API request goes through a RateLimiter, so requests are spread evenly under the 20 / 1s and 100 / 2min limits instead of bursting and stalling.
+* Matches are buffered in a MicroBatcher and loaded once a row count or age threshold is reached.
+* SIGINT / SIGTERM finish the request in flight, load whatever is buffered, then exit.
+* Riot API, network and DB errors are logged and retried, they don't end the service.
+
+Methods:
+--------
+    * poll_ladder - Returns summonerId's for the top n players in Challenger.
+    * get_player_puuid - Returns the puuid for a summonerId.
+    * poll_match_ids - Returns the most recent match_id's for a puuid.
+    * fetch_match - Returns the MatchRecord for a match_id.
+    * run_daemon - Polls, fetches and loads continuously until stopped.
+"""
+
+import time
+from collections import OrderedDict
+
+import psycopg2
+from requests.exceptions import RequestException
+
+from etl import get_watcher, load_matches
+from config import get_tracked_puuids
+from ladder import get_tracker, top_summoner_ids
+from extraction import decode_match
+from records import MatchRecord
+from scheduler import RateLimiter, MicroBatcher, install_stop_event
+
+# Errors from loading a batch that are retried rather than ending the daemon.
+LOAD_ERRORS = (psycopg2.Error,)
+
+# Rounds of match_id's remembered per polled player, so a player whose poll fails or who drops out of the top n isn't refetched.
+SEEN_POLLS = 3
+
+def poll_ladder(tft_watcher, limiter: RateLimiter, n_players: int = 10, region1: str = 'NA1', reload_ladder: bool = False) -> list:
+    """Returns summonerId's for the top n players in Challenger, writing changed entries to ladder_entries.
+
+    Parameters
+    ----------
+    * tft_watcher: TftWatcher
+        The TftWatcher used for the API call.
+    * limiter: RateLimiter
+        The RateLimiter pacing the API call.
+    * n_players: int
+        Number of players returned.
+    * region1: str
+        Region 'NA1' to be used in API call.
+    * reload_ladder: bool
+        Reload the previous ladder state from DB first, for when other processes also poll region1.
+
+    Returns
+    -------
+    * list
+        A list consisting of summonerId's.
+    """
+
+    limiter.acquire()
+    challenger_request = tft_watcher.league.challenger(region=region1)
+    get_tracker(region1).record(challenger_request, reload=reload_ladder)
+
+    return top_summoner_ids(challenger_request, n_players)
+
+def get_player_puuid(tft_watcher, limiter: RateLimiter, summonerId: str, region1: str = 'NA1') -> str:
+    """Returns the puuid for a summonerId.
+
+    Parameters
+    ----------
+    * tft_watcher: TftWatcher
+        The TftWatcher used for the API call.
+    * limiter: RateLimiter
+        The RateLimiter pacing the API call.
+    * summonerId: str
+        The encrypted summonerId.
+    * region1: str
+        Region 'NA1' to be used in API call.
+
+    Returns
+    -------
+    * str
+        The player puuid.
+    """
+
+    limiter.acquire()
+    return tft_watcher.summoner.by_id(region=region1, encrypted_summoner_id=summonerId)['puuid']
+
+def poll_match_ids(tft_watcher, limiter: RateLimiter, puuid: str, n_matches: int = 9, region2: str = 'AMERICAS') -> list:
+    """Returns the most recent match_id's for a puuid.
+
+    Parameters
+    ----------
+    * tft_watcher: TftWatcher
+        The TftWatcher used for the API call.
+    * limiter: RateLimiter
+        The RateLimiter pacing the API call.
+    * puuid: str
+        The player puuid.
+    * n_matches: int
+        Number of match_id's returned.
+    * region2: str
+        Region 'AMERICAS' to be used in API call.
+
+    Returns
+    -------
+    * list
+        A list consisting of match_id's.
+    """
+
+    limiter.acquire()
+    return tft_watcher.match.by_puuid(region=region2, puuid=puuid, count=n_matches)
+
+def fetch_match(tft_watcher, limiter: RateLimiter, match_id: str, region2: str = 'AMERICAS') -> MatchRecord:
+    """Returns the MatchRecord for a match_id.
+
+    Parameters
+    ----------
+    * tft_watcher: TftWatcher
+        The TftWatcher used for the API call.
+    * limiter: RateLimiter
+        The RateLimiter pacing the API call.
+    * match_id: str
+        The match id.
+    * region2: str
+        Region 'AMERICAS' to be used in API call.
+
+    Returns
+    -------
+    * MatchRecord
+        Match data decoded by decode_match.
+    """
+
+    limiter.acquire()
+    return decode_match(tft_watcher.match.by_id(region=region2, match_id=match_id))
+
+def run_daemon(n_players: int = 10, n_matches: int = 9, poll_seconds: float = 600.0, max_rows: int = 5000, max_seconds: float = 300.0):
+    """Polls, fetches and loads continuously until SIGINT / SIGTERM.
+
+    1) poll_ladder() and get_player_puuid() for new summonerId's, plus tracked puuids.
+    2) poll_match_ids() for every player.
+    3) fetch_match() for every match_id not fetched yet, buffered in a MicroBatcher.
+    4) Flush the MicroBatcher through load_matches() whenever it is due.
+    5) Wait out the rest of poll_seconds, still flushing on age, then repeat.
+
+    Parameters
+    ----------
+    * n_players: int
+        Number of Challenger players polled.
+    * n_matches: int
+        Number of recent match_id's polled per player.
+    * poll_seconds: float
+        Minimum seconds between the start of consecutive polls.
+    * max_rows: int
+        Flush once the buffered matches would write at least this many rows.
+    * max_seconds: float
+        Flush once the oldest buffered match has waited this long.
+    """
+
+    stop = install_stop_event()
+
+    watcher = get_watcher()
+    limiter = RateLimiter()
+    batcher = MicroBatcher(load_matches, max_rows=max_rows, max_seconds=max_seconds)
+    summoner_puuids = {}
+    # match_id's fetched, least recently polled first.
+    seen_match_ids = OrderedDict()
+
+    print(f"Beginning ETL daemon, pacing requests every {limiter.interval} seconds.\n")
+
+    try:
+        while not stop.is_set():
+            poll_start = time.monotonic()
+
+            try:
+                summonerId_list = poll_ladder(watcher, limiter, n_players)
+            except RequestException as e:
+                print(f"-Ladder poll failed: {e}")
+                summonerId_list = []
+
+            for summonerId in summonerId_list:
+                if stop.is_set():
+                    break
+                if summonerId not in summoner_puuids:
+                    try:
+                        summoner_puuids[summonerId] = get_player_puuid(watcher, limiter, summonerId)
+                    except RequestException as e:
+                        print(f"-Summoner lookup failed for {summonerId}: {e}")
+
+            tracked_puuids = get_tracked_puuids()
+            puuid_list = list(dict.fromkeys(tracked_puuids + [summoner_puuids[s] for s in summonerId_list if s in summoner_puuids]))
+
+            for puuid in puuid_list:
+                if stop.is_set():
+                    break
+                try:
+                    match_id_list = poll_match_ids(watcher, limiter, puuid, n_matches)
+                except RequestException as e:
+                    print(f"-Match id poll failed for {puuid}: {e}")
+                    continue
+
+                for match_id in match_id_list:
+                    if stop.is_set():
+                        break
+                    if match_id in seen_match_ids:
+                        seen_match_ids.move_to_end(match_id)
+                        continue
+                    try:
+                        batcher.add(fetch_match(watcher, limiter, match_id))
+                    except RequestException as e:
+                        print(f"-Match fetch failed for {match_id}: {e}")
+                        continue
+                    seen_match_ids[match_id] = None
+
+                    if batcher.due():
+                        batcher.try_flush(LOAD_ERRORS)
+
+            # Forget the match ids polled least recently, beyond SEEN_POLLS rounds of every player's recent matches.
+            while len(seen_match_ids) > SEEN_POLLS * n_matches * (n_players + len(tracked_puuids)):
+                seen_match_ids.popitem(last=False)
+
+            while not stop.is_set() and time.monotonic() - poll_start < poll_seconds:
+                if batcher.due():
+                    batcher.try_flush(LOAD_ERRORS)
+                stop.wait(min(1.0, poll_seconds - (time.monotonic() - poll_start)))
+    finally:
+        # Guarded so a failed drain can't hide the error that ended the loop.
+        if not batcher.try_flush(LOAD_ERRORS):
+            print(f"-{len(batcher)} buffered matches were not loaded.")
+        print(f"ETL daemon stopped.")
+
+if __name__=='__main__':
+    run_daemon()
@@ -9,6 +9,8 @@ Classes:
 Methods:
 --------
     * managed_cursor - Opens connection to DB, defines cursor, waits for calling function to execute statement, closes cursor, and closes DB connection sequentially.
+    * insert_df - Inserts a pd.DataFrame() object into the DB table.
+    * ensure_table - Creates a table if it doesn't exist and migrates it, once per process.
 """
 
 from contextlib import contextmanager
@@ -18,8 +20,31 @@ import io
 import csv
 
 import psycopg2
+import psycopg2.errors
 import psycopg2.extras
 
+from db_utils import (
+    create_match_data_table, create_player_metadata_table, create_player_units_table, create_player_traits_table,
+    create_board_compositions_table, create_board_compositions_index, create_composition_keys_table,
+    create_ladder_entries_table, create_ladder_entries_index, create_crawl_queue_table, create_crawl_queue_index, add_extra_column
+)
+
+# Statements creating each table managed by ensure_table, in execution order.
+TABLE_DDL = {
+    'match_data': (create_match_data_table,),
+    'player_metadata': (create_player_metadata_table,),
+    'player_units': (create_player_units_table,),
+    'player_traits': (create_player_traits_table,),
+    'board_compositions': (create_board_compositions_table, create_board_compositions_index, create_composition_keys_table),
+    'ladder_entries': (create_ladder_entries_table, create_ladder_entries_index),
+    'crawl_queue': (create_crawl_queue_table, create_crawl_queue_index),
+}
+
+# Tables with the overflow JSONB column extra, which older deployments lack.
+EXTRA_COLUMN_TABLES = ('match_data', 'player_metadata', 'player_units', 'player_traits')
+
+# Tables already checked by ensure_table in this process.
+_ensured_tables = set()
 
 
 @dataclass
@@ -42,7 +67,7 @@ class DB(object):
 
     Methods
     -------
-    * managed_cursor(self, cursor_factory=None)
+    * managed_cursor(self, cursor_factory=None, name=None, isolation_level=None)
         Opens connection to DB, defines cursor, waits for calling function to execute statement, closes cursor, and closes DB connection sequentially.
     """
 
@@ -53,16 +78,22 @@ class DB(object):
     port: int = 5432
 
     @contextmanager
-    def managed_cursor(self, cursor_factory=None):
+    def managed_cursor(self, cursor_factory=None, name=None, isolation_level=None):
         """Opens connection to DB, defines cursor, waits for calling function to execute statement, closes cursor, and closes DB connection sequentially.
 
+        * If name is given a named (server-side) cursor is created inside a transaction, so results are fetched from the server in chunks instead of all at once.
+
         Parameters
         ----------
         * self: object
             DB class defines all necessary parameters upon creation.
         * cursor_factory: object
             A subclass of the generic psycopg2 cursor found in psycopg2.extras providing a different interface for execuiting queries.
-        
+        * name: str
+            The name of a server-side cursor, a regular client-side cursor if None.
+        * isolation_level: str
+            The transaction isolation level e.g. 'REPEATABLE READ', the server default if None.
+
         Returns
         -------
         * Cursor object
@@ -71,19 +102,24 @@ class DB(object):
 
         self.conn_url = (f'postgresql://{self.user}:{self.password}@{self.host}:{self.port}/{self.db}')
         self.conn = psycopg2.connect(self.conn_url)
-        self.conn.autocommit = True
-        self.curr = self.conn.cursor(cursor_factory=cursor_factory)
+        # Server-side cursors only live inside a transaction.
+        self.conn.autocommit = name is None
+        if isolation_level is not None:
+            self.conn.set_session(isolation_level=isolation_level)
+        self.curr = self.conn.cursor(name=name, cursor_factory=cursor_factory)
         try:
             yield self.curr
         finally:
             self.curr.close()
+            if name is not None:
+                self.conn.rollback()
             self.conn.close()
 
 def insert_df(df, cur, table):
     """Inserts a pd.DataFrame() object into the DB table.
 
     * Managed cursor with DB connection provided.
-    * Pandas DataFrame written to temporary csv with StringIO.
+    * Pandas DataFrame written to temporary csv with StringIO, escaping delimiters, quotes and backslashes for COPY text format (e.g. JSON in the extra column).
     * Temporary csv written to temporary PostgreSQL table.
     * Rows from temporary PostgreSQL table written to destination table passing over those that violate unique constraint.
     * Temporary PostgreSQL table deleted.
@@ -101,7 +137,7 @@ def insert_df(df, cur, table):
     df_columns = list(df)
 
     string_buffer = io.StringIO()
-    df.to_csv(string_buffer, index=False, header=False, sep='|')
+    df.to_csv(string_buffer, index=False, header=False, sep='|', quoting=csv.QUOTE_NONE, escapechar='\\')
     string_buffer.seek(0)
 
     tmp_table = "tmp_table"
@@ -133,6 +169,49 @@ def insert_df(df, cur, table):
          """
     )
 
+def ensure_table(cur, table: str) -> bool:
+    """Creates a table if it doesn't exist and migrates it, once per process.
+
+    * Existence is checked in information_schema first, so DDL only runs when something is actually missing.
+    * DDL uses IF NOT EXISTS, so processes creating the same table concurrently (e.g. crawl workers on a fresh DB) don't fail.
+    * Tables in EXTRA_COLUMN_TABLES created before the overflow column existed get it added.
+    * The result is cached, so per-batch loads never issue DDL (ALTER TABLE takes an ACCESS EXCLUSIVE lock even when it is a no-op).
+
+    Parameters
+    ----------
+    * cur: psycopg2.connect.cursor()
+        A psycopg2 Cursor object.
+    * table: str
+        The name of the table in DB, one of TABLE_DDL.
+
+    Returns
+    -------
+    * bool
+        True if the table was created.
+    """
 
+    if table in _ensured_tables:
+        return False
 
+    cur.execute("SELECT exists(SELECT * FROM information_schema.tables WHERE table_name = %s)", (table,))
+    table_exists = cur.fetchone()[0]
 
+    if not table_exists:
+        try:
+            for ddl in TABLE_DDL[table]:
+                cur.execute(ddl())
+        except (psycopg2.errors.DuplicateTable, psycopg2.errors.UniqueViolation):
+            # Another process created it concurrently, IF NOT EXISTS doesn't cover every race in the catalog.
+            table_exists = True
+    elif table in EXTRA_COLUMN_TABLES:
+        cur.execute(
+            "SELECT exists(SELECT * FROM information_schema.columns WHERE table_name = %s AND column_name = 'extra')",
+            (table,)
+        )
+        if not cur.fetchone()[0]:
+            cur.execute(add_extra_column(table))
+            print(f'-Added extra column to {table}')
+
+    _ensured_tables.add(table)
+
+    return not table_exists
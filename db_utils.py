@@ -8,10 +8,18 @@ Methods:
     * create_player_metadata_table - Returns sql text to create player_metadata.
     * create_player_units_table - Returns sql text to create table player_units.
     * create_player_traits_table - Returns sql text to create table player_units.
+    * create_composition_keys_table - Returns sql text to create table composition_keys.
+    * create_board_compositions_table - Returns sql text to create table board_compositions.
+    * create_board_compositions_index - Returns sql text to create the GIN index on board_compositions.signature.
+    * create_crawl_queue_table - Returns sql text to create table crawl_queue.
+    * create_crawl_queue_index - Returns sql text to create the claim index on crawl_queue.
+    * create_ladder_entries_table - Returns sql text to create table ladder_entries.
+    * create_ladder_entries_index - Returns sql text to create the latest snapshot index on ladder_entries.
+    * add_extra_column - Returns sql text to add the overflow JSONB column extra to an existing table.
 """
 
 def create_match_data_table() :
-    """Return SQL statement to create match_data table in DB.
+    """Return SQL statement to create match_data table in DB if it doesn't exist.
 
     Returns
     -------
@@ -20,20 +28,21 @@ def create_match_data_table() :
     """
 
     query = """
-            CREATE TABLE match_data (
+            CREATE TABLE IF NOT EXISTS match_data (
                 match_id VARCHAR(255) PRIMARY KEY,
                 match_datetime VARCHAR(255),
                 match_length VARCHAR(255),
                 game_version VARCHAR(255),
                 data_version VARCHAR(255),
                 participants VARCHAR(255)[],
+                extra JSONB,
                 timestamp timestamp default current_timestamp
             )
             """
     return query
 
 def create_player_metadata_table():
-    """Return SQL statement to create player_metadata table in DB.
+    """Return SQL statement to create player_metadata table in DB if it doesn't exist.
 
     Returns
     -------
@@ -42,7 +51,7 @@ def create_player_metadata_table():
     """
     
     query = '''
-            CREATE TABLE player_metadata (
+            CREATE TABLE IF NOT EXISTS player_metadata (
                 puuid VARCHAR(255),
                 match_id VARCHAR(255),
                 gold_left VARCHAR(255),
@@ -55,6 +64,7 @@ def create_player_metadata_table():
                 "companion.content_ID" VARCHAR(255),
                 "companion.skin_ID" VARCHAR(255),
                 "companion.species" VARCHAR(255),
+                extra JSONB,
                 PRIMARY KEY (puuid, match_id),
                 timestamp timestamp default current_timestamp
             )
@@ -62,7 +72,7 @@ def create_player_metadata_table():
     return query
 
 def create_player_units_table():
-    """Return SQL statement to create player_units table in DB.
+    """Return SQL statement to create player_units table in DB if it doesn't exist.
 
     Returns
     -------
@@ -71,12 +81,13 @@ def create_player_units_table():
     """
     
     query = """
-            CREATE TABLE player_units (
+            CREATE TABLE IF NOT EXISTS player_units (
                 puuid VARCHAR(255),
                 match_id VARCHAR(255),
                 character_id VARCHAR(255),
                 items VARCHAR(255)[],
                 tier VARCHAR(255),
+                extra JSONB,
                 PRIMARY KEY (puuid, match_id),
                 timestamp timestamp default current_timestamp
             )
@@ -84,7 +95,7 @@ def create_player_units_table():
     return query
 
 def create_player_traits_table():
-    """Return SQL statement to create player_traits table in DB.
+    """Return SQL statement to create player_traits table in DB if it doesn't exist.
 
     Returns
     -------
@@ -93,13 +104,171 @@ def create_player_traits_table():
     """
     
     query = """
-            CREATE TABLE player_traits(
+            CREATE TABLE IF NOT EXISTS player_traits(
                 puuid VARCHAR(255),
                 match_id VARCHAR(255),
                 name VARCHAR(255),
                 num_units VARCHAR(255),
+                extra JSONB,
                 PRIMARY KEY (puuid, match_id),
                 timestamp timestamp default current_timestamp
             )
             """
-    return query
\ No newline at end of file
+    return query
+
+def create_composition_keys_table():
+    """Return SQL statement to create composition_keys table in DB if it doesn't exist.
+
+    Returns
+    -------
+    * str
+        An SQL CREATE TABLE statement.
+    """
+
+    query = """
+            CREATE TABLE IF NOT EXISTS composition_keys (
+                key_id SERIAL PRIMARY KEY,
+                key_name VARCHAR(255) UNIQUE
+            )
+            """
+    return query
+
+def create_board_compositions_table():
+    """Return SQL statement to create board_compositions table in DB if it doesn't exist.
+
+    Returns
+    -------
+    * str
+        An SQL CREATE TABLE statement.
+    """
+
+    query = """
+            CREATE TABLE IF NOT EXISTS board_compositions (
+                puuid VARCHAR(255),
+                match_id VARCHAR(255),
+                placement INTEGER,
+                signature INTEGER[],
+                PRIMARY KEY (puuid, match_id),
+                timestamp timestamp default current_timestamp
+            )
+            """
+    return query
+
+def create_board_compositions_index():
+    """Return SQL statement to create the GIN index on board_compositions.signature in DB.
+
+    Returns
+    -------
+    * str
+        An SQL CREATE INDEX statement.
+    """
+
+    query = """
+            CREATE INDEX IF NOT EXISTS board_compositions_signature_idx
+            ON board_compositions
+            USING GIN (signature)
+            """
+    return query
+
+def create_crawl_queue_table():
+    """Return SQL statement to create crawl_queue table in DB if it doesn't exist.
+
+    Returns
+    -------
+    * str
+        An SQL CREATE TABLE statement.
+    """
+
+    query = """
+            CREATE TABLE IF NOT EXISTS crawl_queue (
+                kind VARCHAR(16),
+                item_id VARCHAR(255),
+                status VARCHAR(16) DEFAULT 'pending',
+                available_at timestamp default current_timestamp,
+                leased_by VARCHAR(255),
+                lease_expires_at timestamp,
+                attempts INTEGER DEFAULT 0,
+                PRIMARY KEY (kind, item_id),
+                timestamp timestamp default current_timestamp
+            )
+            """
+    return query
+
+def create_crawl_queue_index():
+    """Return SQL statement to create the claim index on crawl_queue in DB.
+
+    Returns
+    -------
+    * str
+        An SQL CREATE INDEX statement.
+    """
+
+    query = """
+            CREATE INDEX IF NOT EXISTS crawl_queue_claim_idx
+            ON crawl_queue (status, available_at)
+            WHERE status IN ('pending', 'leased')
+            """
+    return query
+
+def create_ladder_entries_table():
+    """Return SQL statement to create ladder_entries table in DB if it doesn't exist.
+
+    Returns
+    -------
+    * str
+        An SQL CREATE TABLE statement.
+    """
+
+    query = """
+            CREATE TABLE IF NOT EXISTS ladder_entries (
+                region VARCHAR(255),
+                summoner_id VARCHAR(255),
+                summoner_name VARCHAR(255),
+                tier VARCHAR(255),
+                rank VARCHAR(255),
+                league_points INTEGER,
+                wins INTEGER,
+                losses INTEGER,
+                polled_at timestamptz default now(),
+                PRIMARY KEY (region, summoner_id, polled_at)
+            )
+            """
+    return query
+
+def create_ladder_entries_index():
+    """Return SQL statement to create the latest snapshot index on ladder_entries in DB.
+
+    * Covers the per summoner latest snapshot lookup in LadderTracker, so it reads one index entry per summoner regardless of history length.
+
+    Returns
+    -------
+    * str
+        An SQL CREATE INDEX statement.
+    """
+
+    query = """
+            CREATE INDEX IF NOT EXISTS ladder_entries_latest_idx
+            ON ladder_entries (region, summoner_id, polled_at DESC)
+            INCLUDE (league_points, wins, losses)
+            """
+    return query
+
+def add_extra_column(table: str):
+    """Return SQL statement to add the overflow JSONB column extra to a table created before it existed.
+
+    Parameters
+    ----------
+    * table: str
+        The name of the table in DB.
+
+    Returns
+    -------
+    * str
+        An SQL ALTER TABLE statement.
+    """
+
+    query = f"""
+            ALTER TABLE {table}
+            ADD COLUMN IF NOT EXISTS extra JSONB
+            """
+    return query
@@ -4,17 +4,39 @@ import pandas as pd
 
 from riotwatcher import TftWatcher
 
-from db import DB, insert_df
+from db import DB, insert_df, ensure_table
 from config import get_database_creds, get_api_key
-from db_utils import create_match_data_table, create_player_metadata_table, create_player_traits_table, create_player_units_table
-from etl_utils import move_column_inplace, list_to_sql_values
+from compositions import get_board_compositions
+from ladder import get_tracker, top_summoner_ids
+from etl_utils import list_to_sql_values, extra_to_json, columns_to_str
+from extraction import decode_match
+from records import MatchRecord
 
-# Initialize TftWatcher object that abstracts Riot API requests.
-watcher = TftWatcher(api_key=get_api_key())
+# TftWatcher object that abstracts Riot API requests, created on first use by get_watcher().
+_watcher = None
+
+def get_watcher() -> TftWatcher:
+    '''Gets the TftWatcher built from API_KEY, creating it on first use.
+
+    * Created lazily so modules importing etl (e.g. worker with its own key) don't need API_KEY set.
+
+    Returns
+    -------
+    * TftWatcher
+        A TftWatcher object that abstracts Riot API requests.
+    '''
+
+    global _watcher
+    if _watcher is None:
+        _watcher = TftWatcher(api_key=get_api_key())
+
+    return _watcher
 
 def get_summonerId(n_players: int = 10, region1: str = 'NA1') ->  list:
     '''Gets summoner id's for top n players in Challenger.
 
+    * Entries that changed since the previous poll are written to ladder_entries.
+
     Parameters
     ----------
     * region1: str
@@ -26,10 +48,9 @@ def get_summonerId(n_players: int = 10, region1: str = 'NA1') ->  list:
         A list consisting of player names.   
     '''
 
-    challenger_request = watcher.league.challenger(region=region1)
-    challenger_data = challenger_request['entries']
-    challenger_df = pd.DataFrame(challenger_data)
-    top10_summonerId_list = challenger_df.sort_values(by='leaguePoints', ascending=False).head(n = n_players)['summonerId'].tolist()
+    challenger_request = get_watcher().league.challenger(region=region1)
+    get_tracker(region1).record(challenger_request)
+    top10_summonerId_list = top_summoner_ids(challenger_request, n_players)
     
     return top10_summonerId_list
 
@@ -49,7 +70,7 @@ def get_puuid(summonerId_list: list, region1: str = 'NA1') ->  list:
         A list consisting of player puuid's.   
     '''
 
-    puuid_list = [watcher.summoner.by_id(region = region1, encrypted_summoner_id=summonerId)['puuid'] for summonerId in summonerId_list]
+    puuid_list = [get_watcher().summoner.by_id(region = region1, encrypted_summoner_id=summonerId)['puuid'] for summonerId in summonerId_list]
 
     return puuid_list
 
@@ -69,7 +90,7 @@ def get_match_id(puuid_list, n_matches: int = 9, region2: str = 'AMERICAS') ->
         A list consisting of match_id's.   
     '''
 
-    match_id_request = [watcher.match.by_puuid(region = region2, puuid = puuid, count = n_matches) for puuid in puuid_list]
+    match_id_request = [get_watcher().match.by_puuid(region = region2, puuid = puuid, count = n_matches) for puuid in puuid_list]
     match_id_list = list(set([match_id for match_ids in match_id_request for match_id in match_ids]))
 
     return match_id_list
@@ -77,6 +98,8 @@ def get_match_id(puuid_list, n_matches: int = 9, region2: str = 'AMERICAS') ->
 def get_match_data(match_id_list: list, region2: str = 'AMERICAS') ->  dict:   
     '''Gets match data for every match_id in list returned by get_summoner_match.
 
+    * Each API response is decoded into a compact MatchRecord as soon as it arrives, so the raw json is never held for the whole batch.
+
     Parameters
     ----------
     * region2: str
@@ -87,19 +110,19 @@ def get_match_data(match_id_list: list, region2: str = 'AMERICAS') ->  dict:
     Returns
     -------
     * dict
-        A dictionary consisting of key value pair match_id: match_data.   
+        A dictionary consisting of key value pair match_id: MatchRecord.   
     '''
-    match_data_dict = {match_id: watcher.match.by_id(region = region2, match_id = match_id) for match_id in match_id_list}
+    match_data_dict = {match_id: decode_match(get_watcher().match.by_id(region = region2, match_id = match_id)) for match_id in match_id_list}
 
     return match_data_dict
 
-def get_match_metadata(match_data: dict) ->  pd.DataFrame():
+def get_match_metadata(match_data: MatchRecord) ->  pd.DataFrame():
     '''Gets match metadata for values (match_data) in dict returned by get_match_data.
 
     Parameters
     ----------
-    * match_data: dict
-        Match data in json format represented as a dictionary.
+    * match_data: MatchRecord
+        Match data decoded by decode_match.
 
     Returns
     -------
@@ -107,36 +130,29 @@ def get_match_metadata(match_data: dict) ->  pd.DataFrame():
         A Pandas DataFrame consisting of match metadata for the match data supplied.   
     '''
 
-    match_datetime = match_data['info']['game_datetime']
-    match_length = match_data['info']['game_length']
-    game_version = match_data['info']['game_version']
-    
-    match_metadata = pd.json_normalize(
-        data = match_data['metadata']
+    match_metadata = pd.DataFrame(
+        [(
+            match_data.match_id,
+            match_data.game_datetime,
+            match_data.game_length,
+            match_data.game_version,
+            match_data.data_version,
+            list_to_sql_values(match_data.participant_puuids),
+            extra_to_json(match_data.extra)
+        )],
+        columns=['match_id', 'match_datetime', 'match_length', 'game_version', 'data_version', 'participants', 'extra'],
+        dtype=object
     )
-    
-    match_metadata['participants'] = match_metadata['participants'].apply(lambda x: list_to_sql_values([str(y) for y in x]))
-    
-    match_metadata = match_metadata.assign(
-        match_datetime = match_datetime,
-        match_length = match_length,
-        game_version = game_version 
-    )
-    
-    move_column_inplace(match_metadata, 'match_id', 0)
-    move_column_inplace(match_metadata, 'match_datetime', 1)
-    move_column_inplace(match_metadata, 'match_length', 2)
-    move_column_inplace(match_metadata, 'game_version', 3)
 
     return match_metadata
 
-def get_player_metadata(match_data: dict) ->  pd.DataFrame():
+def get_player_metadata(match_data: MatchRecord) ->  pd.DataFrame():
     '''Gets player metadata for values (match_data) in dict returned by get_match_data.
 
     Parameters
     ----------
-    * match_data: dict
-        Match data in json format represented as a dictionary.
+    * match_data: MatchRecord
+        Match data decoded by decode_match.
 
     Returns
     -------
@@ -144,22 +160,35 @@ def get_player_metadata(match_data: dict) ->  pd.DataFrame():
         A Pandas DataFrame consisting of player metadata for the match data supplied.   
     '''   
 
-    match_player_metadata = pd.json_normalize(
-        data = match_data['info'],
-        record_path=['participants']
-    ).drop(columns=['traits', 'units'])
-
-    move_column_inplace(match_player_metadata, 'puuid', 0)
+    match_player_metadata = pd.DataFrame(
+        [(
+            participant.puuid,
+            match_data.match_id,
+            participant.gold_left,
+            participant.last_round,
+            participant.level,
+            participant.placement,
+            participant.players_eliminated,
+            participant.time_eliminated,
+            participant.total_damage_to_players,
+            extra_to_json(participant.extra)
+        ) for participant in match_data.participants],
+        columns=[
+            'puuid', 'match_id', 'gold_left', 'last_round', 'level', 'placement',
+            'players_eliminated', 'time_eliminated', 'total_damage_to_players', 'extra'
+        ],
+        dtype=object
+    )
 
     return match_player_metadata
 
-def get_player_traits(match_data: dict) ->  pd.DataFrame():
+def get_player_traits(match_data: MatchRecord) ->  pd.DataFrame():
     '''Gets player traits for values (match_data) in dict returned by get_match_data.
 
     Parameters
     ----------
-    * match_data: dict
-        Match data in json format represented as a dictionary.
+    * match_data: MatchRecord
+        Match data decoded by decode_match.
 
     Returns
     -------
@@ -167,23 +196,27 @@ def get_player_traits(match_data: dict) ->  pd.DataFrame():
         A Pandas DataFrame consisting of player traits for the match data supplied.   
     '''   
 
-    match_player_traits = pd.json_normalize(
-        data = match_data['info']['participants'],
-        record_path=['traits'],
-        meta = ['puuid']
-    ).drop(columns=['style', 'tier_current', 'tier_total'])
-
-    move_column_inplace(match_player_traits, 'puuid', 0)
+    match_player_traits = pd.DataFrame(
+        [(
+            participant.puuid,
+            match_data.match_id,
+            trait.name,
+            trait.num_units,
+            extra_to_json(trait.extra)
+        ) for participant in match_data.participants for trait in participant.traits],
+        columns=['puuid', 'match_id', 'name', 'num_units', 'extra'],
+        dtype=object
+    )
 
     return match_player_traits
 
-def get_player_units(match_data: dict) ->  pd.DataFrame():
+def get_player_units(match_data: MatchRecord) ->  pd.DataFrame():
     '''Gets player units for values (match_data) in dict returned by get_match_data.
 
     Parameters
     ----------
-    * match_data: dict
-        Match data in json format represented as a dictionary.
+    * match_data: MatchRecord
+        Match data decoded by decode_match.
 
     Returns
     -------
@@ -191,13 +224,18 @@ def get_player_units(match_data: dict) ->  pd.DataFrame():
         A Pandas DataFrame consisting of player units for the match data supplied.   
     '''   
 
-    match_player_units = pd.json_normalize(
-        data = match_data['info']['participants'],
-        record_path=['units'],
-        meta = ['puuid']
-    ).drop(columns=['name', 'rarity'])
-    match_player_units['items'] = match_player_units['items'].apply(lambda x: list_to_sql_values([str(y) for y in x]))
-    move_column_inplace(match_player_units, 'puuid', 0)
+    match_player_units = pd.DataFrame(
+        [(
+            participant.puuid,
+            match_data.match_id,
+            unit.character_id,
+            list_to_sql_values([str(item) for item in unit.items]),
+            unit.tier,
+            extra_to_json(unit.extra)
+        ) for participant in match_data.participants for unit in participant.units],
+        columns=['puuid', 'match_id', 'character_id', 'items', 'tier', 'extra'],
+        dtype=object
+    )
 
     return match_player_units
 
@@ -205,7 +243,7 @@ def pd_to_postgres(df: pd.DataFrame(), table: str):
     '''Uploads a Pandas DataFrame into a PostgreSQL table, creating the table first if it doesn't exist.
 
     * DB connection opened and managed cursor created.
-    * PostgeSQL table created if doesn't already exist.
+    * PostgeSQL table created if doesn't already exist, and migrated, via ensure_table() once per process.
     * Pandas DataFrame written to PostgreSQL table via insert_df().
 
     Parameters
@@ -216,40 +254,68 @@ def pd_to_postgres(df: pd.DataFrame(), table: str):
         The name of the destination table in PostgreSQL.
     '''   
 
+    if len(df) == 0:
+        return
+
     with DB(**get_database_creds()).managed_cursor() as cur:
-        
-        cur.execute(f"select exists(select * from information_schema.tables where table_name='{table}')")
-        table_exists = cur.fetchone()[0]
-        
-        df_exists = len(df) > 0
 
-        table_created = False
+        if ensure_table(cur, table):
+            print(f'-Created {table} table with columns:\n{list(df.columns)}\n')
+
+        insert_df(df, cur, table)
+
+        print(f'-Inserted data into {table}')
+
+def load_matches(match_data_dict: dict):
+    """Extracts DataFrames from a batch of MatchRecord's and inserts them into PostgreSQL.
+
+    1) get_match_metadata()
+    2) get_player_metadata()
+    3) get_player_traits()
+    4) get_player_units()
+    5) get_board_compositions()
+
+    Parameters
+    ----------
+    * match_data_dict: dict
+        A dictionary consisting of key value pair match_id: MatchRecord returned by get_match_data.
+    """
+
+    if not match_data_dict:
+        return
+
+    match_metadata_list, player_metadata_list, player_units_list, player_traits_list = ([] for i in range(4))
+
+    for match_data in match_data_dict.values():
         
-        if df_exists and not table_exists:
-            if (table == 'match_data'):
-                cur.execute(create_match_data_table())
-                table_created = True
-                print(f'-Created {table} table with columns:\n{list(df.columns)}\n')
-            elif (table == 'player_metadata'):
-                cur.execute(create_player_metadata_table())
-                table_created = True
-                print(f'-Created {table} table with columns:\n{list(df.columns)}\n')
-            elif (table == 'player_units'):
-                cur.execute(create_player_units_table())
-                table_created = True
-                print(f'-Created {table} table with columns:\n{list(df.columns)}\n')
-            elif (table == 'player_traits'):
-                cur.execute(create_player_traits_table())
-                table_created = True
-                print(f'-Created {table} table with columns:\n{list(df.columns)}\n')
+        match_metadata = get_match_metadata(match_data)
+        match_metadata = columns_to_str(match_metadata, exclude=['extra'])
+        match_metadata_list.append(match_metadata)
         
-            
-        if table_exists or (not table_exists and table_created):
-            insert_df(df, cur, table)
-
-            print(f'-Inserted data into {table}')
+        player_metadata = get_player_metadata(match_data)
+        player_metadata = columns_to_str(player_metadata, exclude=['extra'])
+        player_metadata_list.append(player_metadata)
         
+        player_traits = get_player_traits(match_data)
+        player_traits = columns_to_str(player_traits, exclude=['extra'])
+        player_traits_list.append(player_traits)
+
+        player_units = get_player_units(match_data)
+        player_units = columns_to_str(player_units, exclude=['extra'])
+        player_units_list.append(player_units)
+    
+    match_metadata = pd.concat(match_metadata_list)
+    player_metadata = pd.concat(player_metadata_list)
+    player_units = pd.concat(player_units_list)
+    player_traits= pd.concat(player_traits_list)
 
+    pd_to_postgres(match_metadata, "match_data")
+    pd_to_postgres(player_metadata, "player_metadata")
+    pd_to_postgres(player_units, "player_units")
+    pd_to_postgres(player_traits, "player_traits")
+
+    board_compositions = get_board_compositions(match_data_dict)
+    pd_to_postgres(board_compositions, "board_compositions")
 
 def run():
     """Sequentially executes the data pipeline.
@@ -258,10 +324,7 @@ def run():
     2)  get_puuid()
     3)  get_match_id()
     4)  get_match_data
-    5a) get_match_metadata()
-    5b) get_player_metadata()
-    5c) get_player_units()
-    5d) get_player_units()
+    5)  load_matches()
     """
 
     print(f"Beginning ETL script.\n")
@@ -282,40 +345,9 @@ def run():
     match_data_dict = get_match_data(match_list)
     print(f"get_match_data runtime: {time.time() - func_start} seconds\n")
 
-    match_metadata_list, player_metadata_list, player_units_list, player_traits_list = ([] for i in range(4))
-
     print(f"Beginning match data extraction / insertion:\n")
     extractions_inserts_start = time.time()
-    for match_id, match_data in match_data_dict.items():
-        
-        match_metadata = get_match_metadata(match_data)
-        match_metadata = match_metadata.astype(str)
-        match_metadata_list.append(match_metadata)
-        
-        player_metadata = get_player_metadata(match_data)
-        player_metadata.insert(1, 'match_id', match_id)
-        player_metadata = player_metadata.astype(str)
-        player_metadata_list.append(player_metadata)
-        
-        player_traits = get_player_traits(match_data)
-        player_traits.insert(1, 'match_id', match_id)
-        player_traits = player_traits.astype(str)
-        player_traits_list.append(player_traits)
-
-        player_units = get_player_units(match_data)
-        player_units.insert(1, 'match_id', match_id)
-        player_units = player_units.astype(str)
-        player_units_list.append(player_units)
-    
-    match_metadata = pd.concat(match_metadata_list)
-    player_metadata = pd.concat(player_metadata_list)
-    player_units = pd.concat(player_units_list)
-    player_traits= pd.concat(player_traits_list)
-
-    pd_to_postgres(match_metadata, "match_data")
-    pd_to_postgres(player_metadata, "player_metadata")
-    pd_to_postgres(player_units, "player_units")
-    pd_to_postgres(player_traits, "player_traits")
+    load_matches(match_data_dict)
 
     print(f"-Extracted data from Pandas DataFrames and inserted into PostgreSQL tables successfully.\n")
     
@@ -6,8 +6,12 @@ Methods:
 --------
     * move_column_inplace - Moves a pd.DataFrame() column to position of choice
     * list_to_sql_values - Converts a python list to str as '{v1, v2, v3 ...}' for insertion into db via psycopg2.cursor.copy_from()
+    * extra_to_json - Converts a record's overflow fields to a JSON str for insertion into a JSONB column.
+    * columns_to_str - Converts pd.DataFrame() columns to str, except those excluded.
 """
 
+import json
+
 import pandas as pd
 
 def move_column_inplace(df: pd.DataFrame(), col: str, pos: int) ->  pd.DataFrame():
@@ -41,4 +45,46 @@ def list_to_sql_values(alist):
     
     """
 
-    return '{' + ','.join(alist) + '}'
\ No newline at end of file
+    return '{' + ','.join(alist) + '}'
+
+def extra_to_json(extra):
+    """Converts a record's overflow fields to a JSON str for insertion into a JSONB column.
+
+    Parameters
+    ----------
+    * extra: dict
+        Overflow fields, or None.
+
+    Returns
+    -------
+    * str
+        A JSON object, or None if there are no overflow fields.
+    """
+
+    return json.dumps(extra) if extra else None
+
+def columns_to_str(df: pd.DataFrame(), exclude: list = ()) ->  pd.DataFrame():
+    """Converts pd.DataFrame() columns to str, except those excluded.
+
+    * Missing values (None) are kept, so they load as NULL rather than 'None'.
+    * Frames should be built with dtype=object, otherwise a None in an int column makes it float and every value converts as e.g. '1.0'.
+
+    Parameters
+    ----------
+    * df: pd.DataFrame()
+        A Pandas dataframe object.
+    * exclude: list
+        Names of columns left as is, e.g. JSON columns whose None must load as NULL rather than 'None'.
+
+    Returns
+    -------
+    * pd.DataFrame()
+        The converted Pandas DataFrame.
+    """
+
+    df = df.copy()
+    for column in df.columns:
+        if column not in exclude:
+            df[column] = df[column].map(lambda value: None if value is None else str(value))
+
+    return df
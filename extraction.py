@@ -0,0 +1,286 @@
+"""Extraction Plans
+
+This file contains extraction plans that decode Riot API match json into MatchRecord's, keyed by metadata.data_version.
+
+* A plan is compiled once per data_version into field accessors for exactly the fields loaded into the DB, and cached in a registry.
+* The first SAMPLE_MATCHES matches of a data_version are sampled for the fields it actually has. New fields are logged and routed to each record's extra, which loads into the overflow JSONB column. Missing fields are logged and decode to defaults.
+* Once sampling is done, each match is only checked by key count per record. A record with a key count not seen before is sampled again, so fields Riot adds under an unchanged data_version are still logged and routed to extra.
+* Field drift on patch day never changes the DataFrame columns loaded by insert_df.
+
+Classes:
+--------
+    * ExtractionPlan - Compiled field accessors for one data_version.
+
+Methods:
+--------
+    * get_plan - Returns the ExtractionPlan for a match, compiling and sampling it as needed.
+    * decode_match - Decodes Riot API match json into a MatchRecord.
+"""
+
+from operator import itemgetter
+
+from records import MatchRecord, ParticipantRecord, TraitRecord, UnitRecord
+
+# Fields loaded into the DB per json level, in record constructor order.
+TARGET_FIELDS = {
+    'metadata': ('match_id', 'data_version', 'participants'),
+    'info': ('game_datetime', 'game_length', 'game_version'),
+    'participant': (
+        'puuid', 'gold_left', 'last_round', 'level', 'placement',
+        'players_eliminated', 'time_eliminated', 'total_damage_to_players'
+    ),
+    'trait': ('name', 'num_units', 'tier_current'),
+    'unit': ('character_id', 'tier', 'items'),
+}
+
+# Fields known to the pipeline but deliberately not loaded, or decoded as nested records.
+DROPPED_FIELDS = {
+    'metadata': (),
+    'info': ('participants', 'queue_id', 'tft_set_number', 'game_variation'),
+    'participant': ('companion', 'traits', 'units'),
+    'trait': ('style', 'tier_total'),
+    'unit': ('name', 'rarity'),
+}
+
+# Values for target fields missing from a match.
+FIELD_DEFAULTS = {
+    'participants': (),
+    'tier_current': 0,
+    'tier': 1,
+    'items': (),
+}
+
+# Matches sampled per data_version before its plan is frozen.
+SAMPLE_MATCHES = 5
+
+def _compile_fields(fields: tuple, seen: set):
+    defaults = [(field, FIELD_DEFAULTS.get(field)) for field in fields]
+
+    def slow(d):
+        return tuple(d.get(field, default) for field, default in defaults)
+
+    if not seen.issuperset(fields):
+        return slow
+
+    fast = itemgetter(*fields)
+
+    def accessor(d):
+        try:
+            return fast(d)
+        except KeyError:
+            # A field seen while sampling isn't on every record, e.g. optional per unit.
+            return slow(d)
+
+    return accessor
+
+def _compile_overflow(overflow: tuple):
+    if not overflow:
+        return lambda d: None
+
+    return lambda d: {field: d[field] for field in overflow if field in d} or None
+
+def _records(match_data: dict) -> dict:
+    info = match_data['info']
+    participants = info.get('participants', ())
+
+    return {
+        'metadata': [match_data['metadata']],
+        'info': [info],
+        'participant': list(participants),
+        'trait': [trait for participant in participants for trait in participant.get('traits', ())],
+        'unit': [unit for participant in participants for unit in participant.get('units', ())],
+    }
+
+class ExtractionPlan(object):
+    """
+    Compiled field accessors for one data_version.
+
+    Attributes
+    ----------
+    * data_version: str
+        The Riot match data version the plan decodes.
+    * samples: int
+        Number of matches sampled into the plan.
+    * seen: dict
+        Fields seen per json level while sampling.
+    * lengths: dict
+        Key counts seen per json level while sampling.
+
+    Methods
+    -------
+    * sample(self, match_data)
+        Adds the fields of a match to seen and recompiles if any are new.
+    * check(self, match_data)
+        Samples a match if any record has a key count not seen before.
+    * compile(self)
+        Compiles field and overflow accessors per json level from seen.
+    * decode(self, match_data)
+        Decodes Riot API match json into a MatchRecord.
+    """
+
+    def __init__(self, data_version: str):
+        self.data_version = data_version
+        self.samples = 0
+        self.seen = {level: set() for level in TARGET_FIELDS}
+        self.lengths = {level: set() for level in TARGET_FIELDS}
+        self._fields = {}
+        self._overflow = {}
+        self._reported = {level: set() for level in TARGET_FIELDS}
+
+    def sample(self, match_data: dict):
+        """Adds the fields of a match to seen and recompiles if any are new.
+
+        Parameters
+        ----------
+        * match_data: dict
+            Match data in json format represented as a dictionary.
+        """
+
+        self.samples += 1
+        changed = False
+        for level, records in _records(match_data).items():
+            self.lengths[level].update(map(len, records))
+            new = set().union(*map(set, records)) - self.seen[level]
+            if new:
+                self.seen[level] |= new
+                changed = True
+
+        if changed or not self._fields:
+            self.compile()
+
+        if self.samples == SAMPLE_MATCHES:
+            for level, fields in TARGET_FIELDS.items():
+                missing = [field for field in fields if field not in self.seen[level]]
+                if missing:
+                    print(f'-data_version {self.data_version}: {level} fields missing, using defaults: {missing}')
+
+    def check(self, match_data: dict) -> bool:
+        """Samples a match if any record has a key count not seen before, e.g. a field added under the same data_version.
+
+        Parameters
+        ----------
+        * match_data: dict
+            Match data in json format represented as a dictionary.
+
+        Returns
+        -------
+        * bool
+            True if the match was sampled.
+        """
+
+        info = match_data['info']
+        participants = info.get('participants', ())
+        lengths = self.lengths
+
+        if (
+            len(match_data['metadata']) in lengths['metadata']
+            and len(info) in lengths['info']
+            and all(len(participant) in lengths['participant'] for participant in participants)
+            and all(len(trait) in lengths['trait'] for participant in participants for trait in participant.get('traits', ()))
+            and all(len(unit) in lengths['unit'] for participant in participants for unit in participant.get('units', ()))
+        ):
+            return False
+
+        self.sample(match_data)
+        return True
+
+    def compile(self):
+        """Compiles field and overflow accessors per json level from seen, logging fields new to the pipeline."""
+
+        for level, fields in TARGET_FIELDS.items():
+            seen = self.seen[level]
+            overflow = tuple(sorted(seen - set(fields) - set(DROPPED_FIELDS[level])))
+
+            unreported = [field for field in overflow if field not in self._reported[level]]
+            if unreported:
+                print(f'-data_version {self.data_version}: new {level} fields routed to extra: {unreported}')
+                self._reported[level].update(unreported)
+
+            self._fields[level] = _compile_fields(fields, seen)
+            self._overflow[level] = _compile_overflow(overflow)
+
+    def decode(self, match_data: dict) -> MatchRecord:
+        """Decodes Riot API match json into a MatchRecord.
+
+        Parameters
+        ----------
+        * match_data: dict
+            Match data in json format represented as a dictionary.
+
+        Returns
+        -------
+        * MatchRecord
+            A compact record of the match.
+        """
+
+        metadata = match_data['metadata']
+        info = match_data['info']
+
+        get_participant, participant_extra = self._fields['participant'], self._overflow['participant']
+        get_trait, trait_extra = self._fields['trait'], self._overflow['trait']
+        get_unit, unit_extra = self._fields['unit'], self._overflow['unit']
+
+        participants = tuple(
+            ParticipantRecord(
+                *get_participant(participant),
+                traits=tuple(TraitRecord(*get_trait(trait), extra=trait_extra(trait)) for trait in participant.get('traits', ())),
+                units=tuple(UnitRecord(*get_unit(unit), extra=unit_extra(unit)) for unit in participant.get('units', ())),
+                extra=participant_extra(participant)
+            )
+            for participant in info.get('participants', ())
+        )
+
+        match_id, data_version, participant_puuids = self._fields['metadata'](metadata)
+        game_datetime, game_length, game_version = self._fields['info'](info)
+
+        metadata_extra, info_extra = self._overflow['metadata'](metadata), self._overflow['info'](info)
+        extra = {**(metadata_extra or {}), **(info_extra or {})} or None
+
+        return MatchRecord(match_id, data_version, game_datetime, game_length, game_version, participant_puuids, participants, extra=extra)
+
+# Cache of data_version: ExtractionPlan.
+_plans = {}
+
+def get_plan(match_data: dict) -> ExtractionPlan:
+    """Returns the ExtractionPlan for a match, compiling a new plan for an unknown data_version and sampling until SAMPLE_MATCHES, then checking.
+
+    Parameters
+    ----------
+    * match_data: dict
+        Match data in json format represented as a dictionary.
+
+    Returns
+    -------
+    * ExtractionPlan
+        The plan for the match data_version.
+    """
+
+    data_version = match_data['metadata'].get('data_version')
+
+    plan = _plans.get(data_version)
+    if plan is None:
+        print(f'-Compiling extraction plan for data_version {data_version}')
+        plan = _plans[data_version] = ExtractionPlan(data_version)
+
+    if plan.samples < SAMPLE_MATCHES:
+        plan.sample(match_data)
+    else:
+        plan.check(match_data)
+
+    return plan
+
+def decode_match(match_data: dict) -> MatchRecord:
+    """Decodes Riot API match json into a MatchRecord using the plan for its data_version.
+
+    Parameters
+    ----------
+    * match_data: dict
+        Match data in json format represented as a dictionary.
+
+    Returns
+    -------
+    * MatchRecord
+        A compact record of the match.
+    """
+
+    return get_plan(match_data).decode(match_data)
@@ -0,0 +1,182 @@
+"""Ladder History
+
+This file contains a class to persist challenger ladder polls into the ladder_entries table, writing only entries that changed since the summoner's latest snapshot.
+
+Classes:
+--------
+    * LadderTracker - Holds the last known LP / wins / losses per summoner for a region and writes changed entries.
+
+Methods:
+--------
+    * get_tracker - Returns the LadderTracker for a region, creating it on first use.
+    * top_summoner_ids - Returns summonerId's for the top n ladder entries by LP.
+"""
+
+import heapq
+
+import psycopg2
+import psycopg2.extras
+
+from db import DB, ensure_table
+from config import get_database_creds
+
+class LadderTracker(object):
+    """
+    Holds the last known LP / wins / losses per summoner for a region and writes changed entries.
+
+    * An entry is written when it differs from the summoner's latest ladder_entries snapshot, so write volume follows ladder churn.
+    * Snapshots are read from DB only for summoners in the current poll that aren't held in memory (new entrants, or everyone after a restart or with reload), one index lookup each, so reads follow churn too rather than history length.
+    * Summoners that drop off the ladder are forgotten in memory, and compared against their latest snapshot again if they come back.
+    * polled_at is set by the server, so it compares with the current_timestamp columns of the other tables.
+
+    Attributes
+    ----------
+    * region: str
+        The ladder region e.g. 'NA1'.
+
+    Methods
+    -------
+    * latest_snapshots(self, cur, summoner_ids)
+        Returns the latest ladder_entries snapshot for each summoner that has one.
+    * record(self, league, reload=False)
+        Writes entries whose LP / wins / losses changed since their latest snapshot and returns them.
+    """
+
+    def __init__(self, region: str):
+        self.region = region
+        self._previous = {}
+
+    def latest_snapshots(self, cur, summoner_ids: list) -> dict:
+        """Returns the latest ladder_entries snapshot for each summoner that has one.
+
+        Parameters
+        ----------
+        * cur: psycopg2.connect.cursor()
+            A psycopg2 Cursor object.
+        * summoner_ids: list
+            The summonerId's to look up.
+
+        Returns
+        -------
+        * dict
+            A dictionary consisting of key value pair summoner_id: (league_points, wins, losses).
+        """
+
+        cur.execute(
+            """
+            SELECT s.summoner_id, e.league_points, e.wins, e.losses
+            FROM unnest(%s::VARCHAR(255)[]) AS s(summoner_id)
+            CROSS JOIN LATERAL (
+                SELECT league_points, wins, losses
+                FROM ladder_entries
+                WHERE region = %s AND summoner_id = s.summoner_id
+                ORDER BY polled_at DESC
+                LIMIT 1
+            ) e
+            """,
+            (list(summoner_ids), self.region)
+        )
+
+        return {summoner_id: (league_points, wins, losses) for summoner_id, league_points, wins, losses in cur.fetchall()}
+
+    def record(self, league: dict, reload: bool = False) -> list:
+        """Writes entries whose LP / wins / losses changed since their latest snapshot and returns them.
+
+        * DB errors are logged and nothing is returned, keeping the previous state so the next poll retries the comparison.
+
+        Parameters
+        ----------
+        * league: dict
+            A league response from the Riot API, e.g. watcher.league.challenger().
+        * reload: bool
+            Read every current summoner's latest snapshot from DB, for when other processes also write this region.
+
+        Returns
+        -------
+        * list
+            The changed ladder entries.
+        """
+
+        entries = league['entries']
+        current = {entry['summonerId']: (entry['leaguePoints'], entry['wins'], entry['losses']) for entry in entries}
+        previous = {} if reload else self._previous
+
+        try:
+            with DB(**get_database_creds()).managed_cursor() as cur:
+                ensure_table(cur, 'ladder_entries')
+
+                missing = [summoner_id for summoner_id in current if summoner_id not in previous]
+                if missing:
+                    previous = {**previous, **self.latest_snapshots(cur, missing)}
+
+                changed = [entry for entry in entries if previous.get(entry['summonerId']) != current[entry['summonerId']]]
+
+                if changed:
+                    # One statement, so every row gets the same server side polled_at.
+                    psycopg2.extras.execute_values(
+                        cur,
+                        """
+                        INSERT INTO ladder_entries (region, summoner_id, summoner_name, tier, rank, league_points, wins, losses)
+                        VALUES %s
+                        ON CONFLICT DO NOTHING
+                        """,
+                        [(
+                            self.region,
+                            entry['summonerId'],
+                            entry.get('summonerName'),
+                            league.get('tier'),
+                            entry.get('rank'),
+                            entry['leaguePoints'],
+                            entry['wins'],
+                            entry['losses']
+                        ) for entry in changed],
+                        page_size=len(changed)
+                    )
+        except psycopg2.Error as e:
+            print(f'-Recording {self.region} ladder into ladder_entries failed: {e}')
+            return []
+
+        self._previous = current
+        print(f'-Inserted {len(changed)} of {len(entries)} ladder entries into ladder_entries')
+
+        return changed
+
+# Cache of region: LadderTracker so state is kept across polls in the same process.
+_trackers = {}
+
+def get_tracker(region: str) -> LadderTracker:
+    """Returns the LadderTracker for a region, creating it on first use.
+
+    Parameters
+    ----------
+    * region: str
+        The ladder region e.g. 'NA1'.
+
+    Returns
+    -------
+    * LadderTracker
+        The tracker for region.
+    """
+
+    if region not in _trackers:
+        _trackers[region] = LadderTracker(region)
+    return _trackers[region]
+
+def top_summoner_ids(league: dict, n_players: int = 10) -> list:
+    """Returns summonerId's for the top n ladder entries by LP.
+
+    Parameters
+    ----------
+    * league: dict
+        A league response from the Riot API, e.g. watcher.league.challenger().
+    * n_players: int
+        Number of summonerId's returned.
+
+    Returns
+    -------
+    * list
+        A list consisting of summonerId's, highest LP first.
+    """
+
+    top_entries = heapq.nlargest(n_players, league['entries'], key=lambda entry: entry['leaguePoints'])
+    return [entry['summonerId'] for entry in top_entries]
@@ -0,0 +1,213 @@
+"""Database Reader
+
+This file contains methods for downstream consumers to read the ETL tables in bounded memory.
+
+* Queries run on a named (server-side) cursor from DB.managed_cursor, and rows are fetched in fixed-size chunks, so a full patch never has to fit in client memory.
+* Common slices (by patch, puuid or match_id) are built as parameterized queries against a whitelist of tables and columns.
+* Numeric columns stored as VARCHAR are decoded once per chunk with vectorized pandas conversions, and repeated strings become categoricals.
+* iter_chunks reads the distinct values of the categorical columns in the slice up front, in the same REPEATABLE READ transaction that streams the rows.
+  All chunks share the same categories, so pd.concat keeps the category dtype, and rows written meanwhile can't fall outside them.
+
+Methods:
+--------
+    * iter_record_batches - Yields lists of row tuples for a slice of a table.
+    * iter_chunks - Yields decoded pd.DataFrame() chunks for a slice of a table.
+    * decode_chunk - Decodes VARCHAR numerics and repeated strings in a pd.DataFrame() chunk.
+"""
+
+import uuid
+
+import pandas as pd
+from psycopg2 import sql
+
+from db import DB
+from config import get_database_creds
+
+# Column types to decode per table, columns not listed are left as returned by psycopg2.
+TABLE_TYPES = {
+    'match_data': {
+        'match_datetime': 'Int64',
+        'match_length': 'float64',
+        'game_version': 'category',
+        'data_version': 'category',
+    },
+    'player_metadata': {
+        'gold_left': 'Int64',
+        'last_round': 'Int64',
+        'level': 'Int64',
+        'placement': 'Int64',
+        'players_eliminated': 'Int64',
+        'time_eliminated': 'float64',
+        'total_damage_to_players': 'Int64',
+    },
+    'player_units': {
+        'character_id': 'category',
+        'tier': 'Int64',
+    },
+    'player_traits': {
+        'name': 'category',
+        'num_units': 'Int64',
+    },
+    'board_compositions': {},
+}
+
+def _slice_query(table: str, columns: list = None, patch: str = None, puuid=None, match_id=None):
+    if table not in TABLE_TYPES:
+        raise ValueError(f'Unknown table {table}, expected one of {list(TABLE_TYPES)}')
+
+    clauses, params = [], []
+
+    if patch is not None:
+        # game_version looks like 'Version 11.19.398.9466 (Sep 23 2021/15:13:10) [PUBLIC] <Releases/11.19>'.
+        if table == 'match_data':
+            clauses.append(sql.SQL('game_version LIKE %s'))
+        else:
+            clauses.append(sql.SQL('match_id IN (SELECT match_id FROM match_data WHERE game_version LIKE %s)'))
+        params.append(f'Version {patch}.%')
+
+    if puuid is not None:
+        puuids = [puuid] if isinstance(puuid, str) else list(puuid)
+        if table == 'match_data':
+            clauses.append(sql.SQL('participants && %s::VARCHAR(255)[]'))
+        else:
+            clauses.append(sql.SQL('puuid = ANY(%s)'))
+        params.append(puuids)
+
+    if match_id is not None:
+        clauses.append(sql.SQL('match_id = ANY(%s)'))
+        params.append([match_id] if isinstance(match_id, str) else list(match_id))
+
+    query = sql.SQL('SELECT {columns} FROM {table}').format(
+        columns=sql.SQL(', ').join(map(sql.Identifier, columns)) if columns else sql.SQL('*'),
+        table=sql.Identifier(table)
+    )
+    if clauses:
+        query = sql.SQL('{query} WHERE {clauses}').format(query=query, clauses=sql.SQL(' AND ').join(clauses))
+
+    return query, params
+
+def _category_dtypes(cur, table: str, columns: list = None, patch: str = None, puuid=None, match_id=None) -> dict:
+    category_columns = [
+        column for column, dtype in TABLE_TYPES[table].items()
+        if dtype == 'category' and (not columns or column in columns)
+    ]
+
+    if not category_columns:
+        return {}
+
+    # One scan for every categorical column, the distinct combinations are few.
+    query, params = _slice_query(table, category_columns, patch, puuid, match_id)
+    cur.execute(sql.SQL('SELECT DISTINCT * FROM ({query}) s').format(query=query), params)
+    rows = cur.fetchall()
+
+    return {
+        column: pd.CategoricalDtype(sorted({row[i] for row in rows if row[i] is not None}))
+        for i, column in enumerate(category_columns)
+    }
+
+def _fetch_batches(cur, query, params: list, chunk_size: int):
+    cur.execute(query, params)
+    while True:
+        rows = cur.fetchmany(chunk_size)
+        if not rows:
+            break
+        yield [column.name for column in cur.description], rows
+
+def iter_record_batches(table: str, columns: list = None, patch: str = None, puuid=None, match_id=None, chunk_size: int = 50000):
+    """Yields lists of row tuples for a slice of a table, fetched from a server-side cursor.
+
+    Parameters
+    ----------
+    * table: str
+        The name of the table in DB, one of TABLE_TYPES.
+    * columns: list
+        Columns to select, all columns if None.
+    * patch: str
+        Only rows from matches on this patch e.g. '11.19'.
+    * puuid: str or list
+        Only rows for these puuids.
+    * match_id: str or list
+        Only rows for these match_id's.
+    * chunk_size: int
+        Rows fetched from the server per batch.
+
+    Yields
+    ------
+    * tuple
+        (column names, list of row tuples) with at most chunk_size rows.
+    """
+
+    query, params = _slice_query(table, columns, patch, puuid, match_id)
+
+    with DB(**get_database_creds()).managed_cursor(name=f'reader_{uuid.uuid4().hex}') as cur:
+        yield from _fetch_batches(cur, query, params, chunk_size)
+
+def decode_chunk(df: pd.DataFrame(), table: str, categories: dict = None) -> pd.DataFrame():
+    """Decodes VARCHAR numerics and repeated strings in a pd.DataFrame() chunk.
+
+    * Values that don't parse as numbers (e.g. 'None', 'nan') become missing values.
+    * Without categories, each chunk gets only the categories it contains, so chunks decoded separately fall back to object dtype in pd.concat.
+      Combine those with pandas.api.types.union_categoricals instead.
+
+    Parameters
+    ----------
+    * df: pd.DataFrame()
+        A Pandas DataFrame read from table.
+    * table: str
+        The name of the table in DB the chunk was read from.
+    * categories: dict
+        A dictionary consisting of key value pair column: pd.CategoricalDtype() shared by every chunk.
+
+    Returns
+    -------
+    * pd.DataFrame()
+        The decoded Pandas DataFrame.
+    """
+
+    for column, dtype in TABLE_TYPES[table].items():
+        if column not in df:
+            continue
+        if dtype == 'category':
+            df[column] = df[column].astype((categories or {}).get(column, 'category'))
+        elif dtype == 'Int64':
+            df[column] = pd.to_numeric(df[column], errors='coerce').round().astype('Int64')
+        else:
+            df[column] = pd.to_numeric(df[column], errors='coerce').astype(dtype)
+
+    return df
+
+def iter_chunks(table: str, columns: list = None, patch: str = None, puuid=None, match_id=None, chunk_size: int = 50000):
+    """Yields decoded pd.DataFrame() chunks for a slice of a table, fetched from a server-side cursor.
+
+    * Categorical columns use the same categories in every chunk, so chunks can be combined with pd.concat.
+
+    Parameters
+    ----------
+    * table: str
+        The name of the table in DB, one of TABLE_TYPES.
+    * columns: list
+        Columns to select, all columns if None.
+    * patch: str
+        Only rows from matches on this patch e.g. '11.19'.
+    * puuid: str or list
+        Only rows for these puuids.
+    * match_id: str or list
+        Only rows for these match_id's.
+    * chunk_size: int
+        Rows per chunk.
+
+    Yields
+    ------
+    * pd.DataFrame()
+        A decoded Pandas DataFrame with at most chunk_size rows.
+    """
+
+    query, params = _slice_query(table, columns, patch, puuid, match_id)
+
+    # Categories and rows are read from one snapshot, so values committed in between can't decode to NaN.
+    with DB(**get_database_creds()).managed_cursor(name=f'reader_{uuid.uuid4().hex}', isolation_level='REPEATABLE READ') as cur:
+        with cur.connection.cursor() as category_cur:
+            categories = _category_dtypes(category_cur, table, columns, patch, puuid, match_id)
+
+        for column_names, rows in _fetch_batches(cur, query, params, chunk_size):
+            yield decode_chunk(pd.DataFrame.from_records(rows, columns=column_names), table, categories)
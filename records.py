@@ -0,0 +1,156 @@
+"""Match Records
+
+This file contains compact record classes that hold match data between fetch and load, in place of whole Riot API json dicts.
+
+* Every record uses __slots__, so no per-instance __dict__ is allocated.
+* Repeated strings (puuids, character_id's, trait names, game_version ...) are interned, so each distinct value is stored once no matter how many matches reference it.
+* Repeated tuples (unit items) are shared through a cache the same way.
+* Fields not loaded into the DB (companion, style, rarity, unit name, trait tier_total ...) are dropped at decode time by extraction.decode_match.
+* Fields the pipeline doesn't know about are kept per record in extra, for the overflow JSONB column.
+
+Classes:
+--------
+    * UnitRecord - A unit on a player board.
+    * TraitRecord - A trait on a player board.
+    * ParticipantRecord - A player in a match.
+    * MatchRecord - A match.
+"""
+
+from sys import intern
+
+# Cache of items tuple: items tuple so equal tuples share one object.
+_interned_tuples = {}
+
+def _intern_tuple(values) -> tuple:
+    values = tuple(values or ())
+    return _interned_tuples.setdefault(values, values)
+
+def _intern(value):
+    # Fields missing from a data_version decode to None, which can't be interned.
+    return intern(value) if isinstance(value, str) else value
+
+class UnitRecord(object):
+    """
+    Represents a unit on a player board.
+
+    Attributes
+    ----------
+    * character_id: str
+        The unit character_id.
+    * tier: int
+        The unit star level.
+    * items: tuple
+        The unit item ids.
+    * extra: dict
+        Unknown unit fields, None if there are none.
+    """
+
+    __slots__ = ('character_id', 'tier', 'items', 'extra')
+
+    def __init__(self, character_id: str, tier: int, items: tuple, extra: dict = None):
+        self.character_id = _intern(character_id)
+        self.tier = tier
+        self.items = _intern_tuple(items)
+        self.extra = extra
+
+class TraitRecord(object):
+    """
+    Represents a trait on a player board.
+
+    Attributes
+    ----------
+    * name: str
+        The trait name.
+    * num_units: int
+        The number of units contributing to the trait.
+    * tier_current: int
+        The active trait tier, 0 if inactive.
+    * extra: dict
+        Unknown trait fields, None if there are none.
+    """
+
+    __slots__ = ('name', 'num_units', 'tier_current', 'extra')
+
+    def __init__(self, name: str, num_units: int, tier_current: int, extra: dict = None):
+        self.name = _intern(name)
+        self.num_units = num_units
+        self.tier_current = tier_current
+        self.extra = extra
+
+class ParticipantRecord(object):
+    """
+    Represents a player in a match.
+
+    Attributes
+    ----------
+    * puuid: str
+        The player puuid.
+    * gold_left, last_round, level, placement, players_eliminated: int
+        End of game player stats.
+    * time_eliminated: float
+        Seconds into the match the player was eliminated.
+    * total_damage_to_players: int
+        Total damage dealt to other players.
+    * traits: tuple
+        TraitRecord's for the player board.
+    * units: tuple
+        UnitRecord's for the player board.
+    * extra: dict
+        Unknown participant fields, None if there are none.
+    """
+
+    __slots__ = (
+        'puuid', 'gold_left', 'last_round', 'level', 'placement', 'players_eliminated',
+        'time_eliminated', 'total_damage_to_players', 'traits', 'units', 'extra'
+    )
+
+    def __init__(self, puuid: str, gold_left: int, last_round: int, level: int, placement: int, players_eliminated: int,
+                 time_eliminated: float, total_damage_to_players: int, traits: tuple, units: tuple, extra: dict = None):
+        self.puuid = _intern(puuid)
+        self.gold_left = gold_left
+        self.last_round = last_round
+        self.level = level
+        self.placement = placement
+        self.players_eliminated = players_eliminated
+        self.time_eliminated = time_eliminated
+        self.total_damage_to_players = total_damage_to_players
+        self.traits = traits
+        self.units = units
+        self.extra = extra
+
+class MatchRecord(object):
+    """
+    Represents a match.
+
+    Attributes
+    ----------
+    * match_id: str
+        The match id.
+    * data_version: str
+        The Riot match data version.
+    * game_datetime: int
+        The match start as a unix timestamp in milliseconds.
+    * game_length: float
+        The match length in seconds.
+    * game_version: str
+        The game client version.
+    * participant_puuids: tuple
+        The puuid of every player in the match, in metadata order.
+    * participants: tuple
+        ParticipantRecord's for every player in the match.
+    * extra: dict
+        Unknown metadata / info fields, None if there are none.
+    """
+
+    __slots__ = ('match_id', 'data_version', 'game_datetime', 'game_length', 'game_version', 'participant_puuids', 'participants', 'extra')
+
+    def __init__(self, match_id: str, data_version: str, game_datetime: int, game_length: float, game_version: str,
+                 participant_puuids: tuple, participants: tuple, extra: dict = None):
+        self.match_id = match_id
+        self.data_version = _intern(data_version)
+        self.game_datetime = game_datetime
+        self.game_length = game_length
+        self.game_version = _intern(game_version)
+        self.participant_puuids = tuple(_intern(puuid) for puuid in participant_puuids or ())
+        self.participants = participants
+        self.extra = extra
@@ -0,0 +1,205 @@
+"""Scheduling Utilities
+
+This file contains classes to pace Riot API requests and to batch loads for long running ingestion.
+
+Classes:
+--------
+    * RateLimiter - Spreads requests evenly under one or more (limit, period) rate limits.
+    * MicroBatcher - Buffers MatchRecord's and flushes them to a load function on row count or age thresholds.
+
+Methods:
+--------
+    * install_stop_event - Returns an event set on SIGINT / SIGTERM, for long running loops to drain and exit.
+"""
+
+import signal
+import threading
+import time
+from collections import deque
+
+# Riot API development key limits as (requests, seconds).
+RIOT_RATE_LIMITS = ((20, 1.0), (100, 120.0))
+
+class RateLimiter(object):
+    """
+    Spreads requests evenly under one or more (limit, period) rate limits.
+
+    * Requests are paced at the tightest sustained rate (e.g. 100 / 120s -> one every 1.2s) instead of bursting until a limit is hit.
+    * A sliding window per limit is still kept, so pacing never exceeds any limit even if the clock jumps or several callers share the limiter.
+
+    Attributes
+    ----------
+    * limits: tuple
+        (requests, seconds) pairs that must all be respected.
+    * interval: float
+        Seconds between evenly spaced requests.
+
+    Methods
+    -------
+    * acquire(self)
+        Blocks until a request may be sent and records it.
+    """
+
+    def __init__(self, limits: tuple = RIOT_RATE_LIMITS):
+        self.limits = limits
+        self.interval = max(period / limit for limit, period in limits)
+        self._windows = [deque() for _ in limits]
+        self._next_slot = 0.0
+
+    def acquire(self):
+        """Blocks until a request may be sent and records it."""
+
+        while True:
+            now = time.monotonic()
+            wait = self._next_slot - now
+
+            for (limit, period), window in zip(self.limits, self._windows):
+                while window and window[0] <= now - period:
+                    window.popleft()
+                if len(window) >= limit:
+                    wait = max(wait, window[0] + period - now)
+
+            if wait <= 0:
+                break
+            time.sleep(wait)
+
+        for window in self._windows:
+            window.append(now)
+        self._next_slot = now + self.interval
+
+class MicroBatcher(object):
+    """
+    Buffers MatchRecord's and flushes them to a load function on row count or age thresholds.
+
+    Attributes
+    ----------
+    * load: callable
+        Called with a dictionary of match_id: MatchRecord on flush, e.g. etl.load_matches.
+    * max_rows: int
+        Flush once the buffered matches would write at least this many rows.
+    * max_seconds: float
+        Flush once the oldest buffered match has waited this long.
+    * retry_seconds: float
+        Seconds due() stays False after a failed try_flush.
+
+    Methods
+    -------
+    * add(self, match_data)
+        Buffers a MatchRecord.
+    * due(self)
+        Returns True if a threshold has been reached.
+    * flush(self)
+        Loads every buffered match and empties the buffer.
+    * try_flush(self, errors)
+        Flushes, keeping the buffer and backing off if the load raises one of errors.
+    """
+
+    def __init__(self, load, max_rows: int = 5000, max_seconds: float = 300.0, retry_seconds: float = 30.0):
+        self.load = load
+        self.max_rows = max_rows
+        self.max_seconds = max_seconds
+        self.retry_seconds = retry_seconds
+        self._matches = {}
+        self._rows = 0
+        self._oldest = None
+        self._retry_at = 0.0
+
+    def __len__(self):
+        return len(self._matches)
+
+    def add(self, match_data):
+        """Buffers a MatchRecord.
+
+        Parameters
+        ----------
+        * match_data: MatchRecord
+            Match data decoded by decode_match.
+        """
+
+        if self._oldest is None:
+            self._oldest = time.monotonic()
+        self._matches[match_data.match_id] = match_data
+        # One match_data row, then per participant a player_metadata and board_compositions row plus its units and traits.
+        self._rows += 1 + sum(2 + len(participant.units) + len(participant.traits) for participant in match_data.participants)
+
+    def due(self) -> bool:
+        """Returns True if a threshold has been reached.
+
+        Returns
+        -------
+        * bool
+            Whether the buffer should be flushed.
+        """
+
+        if not self._matches or time.monotonic() < self._retry_at:
+            return False
+        return self._rows >= self.max_rows or time.monotonic() - self._oldest >= self.max_seconds
+
+    def flush(self) -> list:
+        """Loads every buffered match and empties the buffer.
+
+        * If the load raises, the buffer is kept and the error propagates.
+
+        Returns
+        -------
+        * list
+            The match_id's loaded.
+        """
+
+        if not self._matches:
+            return []
+
+        flush_start = time.time()
+        matches = self._matches
+        self.load(matches)
+        self._matches, self._rows, self._oldest, self._retry_at = {}, 0, None, 0.0
+        print(f"-Loaded {len(matches)} matches in {time.time() - flush_start} seconds.\n")
+
+        return list(matches)
+
+    def try_flush(self, errors: tuple = (Exception,)) -> bool:
+        """Flushes, keeping the buffer and backing off if the load raises one of errors.
+
+        * A failed flush is logged and due() returns False for retry_seconds, so a transient DB error is retried instead of ending a long running service.
+
+        Parameters
+        ----------
+        * errors: tuple
+            Exception types treated as transient, e.g. (psycopg2.Error,).
+
+        Returns
+        -------
+        * bool
+            True if the buffer was loaded.
+        """
+
+        try:
+            self.flush()
+        except errors as e:
+            self._retry_at = time.monotonic() + self.retry_seconds
+            print(f"-Loading {len(self)} matches failed, retrying in {self.retry_seconds} seconds: {e}")
+            return False
+
+        return True
+
+def install_stop_event() -> threading.Event:
+    """Returns an event set on SIGINT / SIGTERM, for long running loops to drain and exit.
+
+    * The loop checks the event between requests, so the request in flight finishes and buffered matches are flushed before exit.
+
+    Returns
+    -------
+    * threading.Event
+        Set once a stop signal is received.
+    """
+
+    stop = threading.Event()
+
+    def _stop(signum, frame):
+        print(f"-Received signal {signum}, draining in-flight batch.\n")
+        stop.set()
+
+    signal.signal(signal.SIGINT, _stop)
+    signal.signal(signal.SIGTERM, _stop)
+
+    return stop
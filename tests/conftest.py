@@ -0,0 +1,64 @@
+import os
+import sys
+from contextlib import contextmanager
+
+import pytest
+
+# Modules live at the repository root rather than in a package.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from records import MatchRecord, ParticipantRecord, TraitRecord, UnitRecord
+
+
+def _make_participant(puuid, placement, units=(), traits=()):
+    return ParticipantRecord(
+        puuid, 0, 30, 8, placement, 0, 1800.0, 50,
+        traits=tuple(TraitRecord(name, 3, tier) for name, tier in traits),
+        units=tuple(UnitRecord(character_id, star, ()) for character_id, star in units)
+    )
+
+
+def _make_match(match_id, participants=None, n_participants=2, n_units=3, n_traits=2):
+    if participants is None:
+        participants = tuple(
+            _make_participant(f'puuid{i}', i + 1, units=[('TFT5_Garen', 2)] * n_units, traits=[('Set5_Knight', 1)] * n_traits)
+            for i in range(n_participants)
+        )
+    return MatchRecord(match_id, '5', 0, 1800.0, 'Version 11.19', tuple(p.puuid for p in participants), tuple(participants))
+
+
+@pytest.fixture
+def make_participant():
+    """Builds a ParticipantRecord from (character_id, star) units and (name, tier_current) traits."""
+    return _make_participant
+
+
+@pytest.fixture
+def make_match():
+    """Builds a MatchRecord from participants, or from generated participants with n_units / n_traits each."""
+    return _make_match
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    """Patches DB / get_database_creds in a module so every managed_cursor() yields the given cursor.
+
+    The keyword arguments of every managed_cursor() call are recorded in install.opened.
+    """
+
+    def install(module, cursor):
+        class FakeDB(object):
+            def __init__(self, **kwargs):
+                pass
+
+            @contextmanager
+            def managed_cursor(self, **kwargs):
+                install.opened.append(kwargs)
+                yield cursor
+
+        monkeypatch.setattr(module, 'DB', FakeDB)
+        monkeypatch.setattr(module, 'get_database_creds', lambda: {})
+        return cursor
+
+    install.opened = []
+    return install
@@ -0,0 +1,107 @@
+import psycopg2.errors
+import pytest
+
+import compositions
+from compositions import get_board_keys, get_key_ids, find_boards
+
+
+class FakeCursor(object):
+    """Serves composition_keys from a dict and board_compositions from a list, recording executed queries."""
+
+    def __init__(self, key_ids=None, boards=None):
+        self.key_ids = dict(key_ids or {})
+        self.boards = boards or []
+        self.executed = []
+        self._rows = []
+
+    def execute(self, query, params=None):
+        self.executed.append((' '.join(query.split()), params))
+        if 'FROM composition_keys' in query:
+            self._rows = [(key_name, self.key_ids[key_name]) for key_name in params[0] if key_name in self.key_ids]
+        elif 'FROM board_compositions' in query:
+            required, limit = params
+            self._rows = [
+                (puuid, match_id, placement)
+                for puuid, match_id, placement, signature in sorted(self.boards, key=lambda board: board[2])
+                if set(required) <= set(signature)
+            ][:limit]
+
+    def fetchall(self):
+        return self._rows
+
+
+class MissingTablesCursor(object):
+
+    def execute(self, query, params=None):
+        raise psycopg2.errors.UndefinedTable('relation "composition_keys" does not exist')
+
+
+@pytest.fixture(autouse=True)
+def clear_key_ids(monkeypatch):
+    monkeypatch.setattr(compositions, '_key_ids', {})
+
+
+def test_get_board_keys_expands_star_levels_and_active_tiers(make_match, make_participant):
+    match = make_match('NA1_1', participants=(
+        make_participant('a', 1, units=[('TFT5_Garen', 3)], traits=[('Set5_Knight', 2), ('Set5_Legionnaire', 0)]),
+        make_participant('b', 8),
+    ))
+
+    boards = get_board_keys(match)
+
+    assert boards['a'] == (1, {
+        'unit:TFT5_Garen:1', 'unit:TFT5_Garen:2', 'unit:TFT5_Garen:3',
+        'trait:Set5_Knight:1', 'trait:Set5_Knight:2',
+    })
+    assert boards['b'] == (8, set())
+
+
+def test_get_key_ids_inserts_new_keys_in_sorted_order(monkeypatch):
+    cur = FakeCursor()
+    inserted = []
+
+    def execute_values(cur, query, rows, page_size=100):
+        inserted.extend(key_name for key_name, in rows)
+        cur.key_ids.update((key_name, len(cur.key_ids) + 1) for key_name, in rows)
+
+    monkeypatch.setattr(compositions.psycopg2.extras, 'execute_values', execute_values)
+
+    key_ids = get_key_ids(cur, {'unit:b:1', 'trait:c:1', 'unit:a:1'})
+    assert inserted == ['trait:c:1', 'unit:a:1', 'unit:b:1']
+    assert key_ids == {'trait:c:1': 1, 'unit:a:1': 2, 'unit:b:1': 3}
+
+    # Cached keys don't round trip again.
+    get_key_ids(cur, {'unit:a:1', 'unit:d:1'})
+    assert inserted[3:] == ['unit:d:1']
+
+
+def test_find_boards_queries_signature_containment(fake_db):
+    cur = fake_db(compositions, FakeCursor(
+        key_ids={'unit:TFT5_Garen:3': 7, 'trait:Set5_Knight:1': 2},
+        boards=[('a', 'NA1_1', 4, [2, 7, 9]), ('b', 'NA1_1', 1, [2, 7]), ('c', 'NA1_2', 2, [2])]
+    ))
+
+    boards = find_boards(units={'TFT5_Garen': 3}, traits=['Set5_Knight'])
+
+    assert boards.values.tolist() == [['b', 'NA1_1', 1], ['a', 'NA1_1', 4]]
+    query, params = cur.executed[-1]
+    assert 'WHERE signature @> %s::INTEGER[] ORDER BY placement' in query
+    assert params == ([2, 7], None)
+
+
+def test_find_boards_with_unseen_key_skips_board_query(fake_db):
+    cur = fake_db(compositions, FakeCursor(key_ids={'unit:TFT5_Garen:1': 1}))
+
+    boards = find_boards(units=['TFT5_Garen', 'TFT5_Lux'])
+
+    assert boards.empty
+    assert len(cur.executed) == 1
+
+
+def test_find_boards_on_empty_database_returns_empty_frame(fake_db):
+    fake_db(compositions, MissingTablesCursor())
+
+    boards = find_boards(units={'TFT5_Garen': 3}, traits=['Set5_Knight'])
+
+    assert boards.empty
+    assert list(boards.columns) == ['puuid', 'match_id', 'placement']
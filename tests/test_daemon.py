@@ -0,0 +1,73 @@
+import threading
+
+from requests.exceptions import ConnectionError
+
+import daemon
+from daemon import run_daemon
+
+
+def run(monkeypatch, make_match, rounds, n_players=2, n_matches=2):
+    """Runs run_daemon for one poll per entry of rounds, a dict of puuid: match_id's or None for a failed poll."""
+
+    stop = threading.Event()
+    rounds = list(rounds)
+    fetched = []
+    current = {}
+
+    def poll_ladder(watcher, limiter, n_players):
+        if not rounds:
+            stop.set()
+            return []
+        current.clear()
+        current.update(rounds.pop(0))
+        return list(current)
+
+    def poll_match_ids(watcher, limiter, puuid, n_matches):
+        if current[puuid] is None:
+            raise ConnectionError('connection reset')
+        return current[puuid]
+
+    def fetch_match(watcher, limiter, match_id):
+        fetched.append(match_id)
+        return make_match(match_id)
+
+    monkeypatch.setattr(daemon, 'install_stop_event', lambda: stop)
+    monkeypatch.setattr(daemon, 'get_watcher', lambda: None)
+    monkeypatch.setattr(daemon, 'get_tracked_puuids', lambda: [])
+    monkeypatch.setattr(daemon, 'load_matches', lambda matches: None)
+    monkeypatch.setattr(daemon, 'poll_ladder', poll_ladder)
+    monkeypatch.setattr(daemon, 'get_player_puuid', lambda watcher, limiter, summonerId: summonerId)
+    monkeypatch.setattr(daemon, 'poll_match_ids', poll_match_ids)
+    monkeypatch.setattr(daemon, 'fetch_match', fetch_match)
+
+    run_daemon(n_players=n_players, n_matches=n_matches, poll_seconds=0.0)
+    return fetched
+
+
+def test_failed_player_poll_does_not_refetch_their_matches(monkeypatch, make_match):
+    fetched = run(monkeypatch, make_match, [
+        {'a': ['NA1_1'], 'b': ['NA1_2']},
+        {'a': ['NA1_3', 'NA1_1'], 'b': None},
+        {'a': ['NA1_3', 'NA1_1'], 'b': ['NA1_2']},
+    ])
+
+    assert fetched == ['NA1_1', 'NA1_2', 'NA1_3']
+
+
+def test_player_leaving_the_top_is_not_refetched_on_return(monkeypatch, make_match):
+    fetched = run(monkeypatch, make_match, [
+        {'a': ['NA1_1'], 'b': ['NA1_2']},
+        {'a': ['NA1_1'], 'c': ['NA1_3']},
+        {'a': ['NA1_1'], 'b': ['NA1_2']},
+    ])
+
+    assert fetched == ['NA1_1', 'NA1_2', 'NA1_3']
+
+
+def test_seen_match_ids_are_bounded(monkeypatch, make_match):
+    # SEEN_POLLS * n_matches * n_players = 3 match ids remembered.
+    rounds = [{'a': [f'NA1_{i}']} for i in range(5)] + [{'a': ['NA1_0']}]
+
+    fetched = run(monkeypatch, make_match, rounds, n_players=1, n_matches=1)
+
+    assert fetched == ['NA1_0', 'NA1_1', 'NA1_2', 'NA1_3', 'NA1_4', 'NA1_0']
@@ -0,0 +1,32 @@
+import csv
+import io
+
+from etl import get_player_metadata, get_player_units
+from etl_utils import columns_to_str
+from records import UnitRecord
+
+
+def test_missing_values_stay_null_and_ints_keep_their_format(make_match, make_participant):
+    participant = make_participant('a', 1)
+    participant.units = (UnitRecord('TFT5_Garen', 2, (44,)), UnitRecord('TFT5_Lux', None, ()))
+    participant.time_eliminated = None
+
+    units = columns_to_str(get_player_units(make_match('NA1_1', participants=(participant,))), exclude=['extra'])
+    metadata = columns_to_str(get_player_metadata(make_match('NA1_1', participants=(participant,))), exclude=['extra'])
+
+    assert units['tier'][0] == '2'
+    assert units['tier'].isna().tolist() == [False, True]
+    assert metadata['placement'][0] == '1'
+    assert metadata['time_eliminated'].isna().all()
+
+
+def test_missing_values_copy_as_empty_fields(make_match, make_participant):
+    participant = make_participant('a', 3)
+    participant.units = (UnitRecord('TFT5_Lux', None, ()),)
+
+    units = columns_to_str(get_player_units(make_match('NA1_1', participants=(participant,))), exclude=['extra'])
+    buffer = io.StringIO()
+    # As written by db.insert_df, where COPY reads an empty field as NULL.
+    units.to_csv(buffer, index=False, header=False, sep='|', quoting=csv.QUOTE_NONE, escapechar='\\')
+
+    assert buffer.getvalue() == 'a|NA1_1|TFT5_Lux|{}||\n'
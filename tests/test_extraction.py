@@ -0,0 +1,103 @@
+import pytest
+
+import extraction
+from extraction import SAMPLE_MATCHES, get_plan, decode_match
+
+
+@pytest.fixture(autouse=True)
+def clear_plans(monkeypatch):
+    monkeypatch.setattr(extraction, '_plans', {})
+
+
+def make_match_data(match_id='NA1_1', data_version='5', unit=None, trait=None, participant_extra=None, info_extra=None):
+    participant = {
+        'puuid': 'a', 'gold_left': 0, 'last_round': 30, 'level': 8, 'placement': 1,
+        'players_eliminated': 2, 'time_eliminated': 1800.0, 'total_damage_to_players': 120,
+        'companion': {}, 'traits': [trait or {'name': 'Set5_Knight', 'num_units': 4, 'tier_current': 2, 'style': 2, 'tier_total': 3}],
+        'units': [unit or {'character_id': 'TFT5_Garen', 'tier': 2, 'items': [44], 'name': '', 'rarity': 4}],
+        **(participant_extra or {})
+    }
+    return {
+        'metadata': {'match_id': match_id, 'data_version': data_version, 'participants': ['a']},
+        'info': {
+            'game_datetime': 1632400000000, 'game_length': 1850.0, 'game_version': 'Version 11.19',
+            'participants': [participant], 'queue_id': 1100, 'tft_set_number': 5, **(info_extra or {})
+        },
+    }
+
+
+def test_decode_match_loads_target_fields_and_drops_known_fields():
+    match = decode_match(make_match_data())
+    participant = match.participants[0]
+
+    assert (match.match_id, match.data_version, match.participant_puuids, match.extra) == ('NA1_1', '5', ('a',), None)
+    assert (participant.placement, participant.total_damage_to_players, participant.extra) == (1, 120, None)
+    assert (participant.units[0].character_id, participant.units[0].tier, participant.units[0].items) == ('TFT5_Garen', 2, (44,))
+    assert (participant.traits[0].name, participant.traits[0].tier_current, participant.traits[0].extra) == ('Set5_Knight', 2, None)
+
+
+def test_unknown_fields_are_routed_to_extra_and_logged_once(capsys):
+    for i in range(3):
+        match = decode_match(make_match_data(
+            match_id=f'NA1_{i}', participant_extra={'augments': ['Cutthroat']}, info_extra={'tft_game_type': 'standard'}
+        ))
+
+    assert match.extra == {'tft_game_type': 'standard'}
+    assert match.participants[0].extra == {'augments': ['Cutthroat']}
+    assert capsys.readouterr().out.count('new participant fields routed to extra') == 1
+
+
+def test_missing_fields_decode_to_defaults_and_are_logged_after_sampling(capsys):
+    for i in range(SAMPLE_MATCHES):
+        match = decode_match(make_match_data(
+            match_id=f'NA1_{i}', unit={'character_id': 'TFT5_Garen'}, trait={'name': 'Set5_Knight', 'num_units': 1}
+        ))
+
+    unit, trait = match.participants[0].units[0], match.participants[0].traits[0]
+    assert (unit.tier, unit.items) == (1, ())
+    assert trait.tier_current == 0
+
+    out = capsys.readouterr().out
+    assert "unit fields missing, using defaults: ['tier', 'items']" in out
+    assert "trait fields missing, using defaults: ['tier_current']" in out
+
+
+def test_field_missing_on_some_records_falls_back_to_default():
+    decode_match(make_match_data())
+    match = decode_match(make_match_data(unit={'character_id': 'TFT5_Lux', 'tier': 3}))
+
+    assert match.participants[0].units[0].items == ()
+
+
+def test_plan_is_cached_per_data_version_and_stops_sampling():
+    for i in range(SAMPLE_MATCHES + 2):
+        plan = get_plan(make_match_data(match_id=f'NA1_{i}'))
+
+    assert plan.samples == SAMPLE_MATCHES
+    assert get_plan(make_match_data(data_version='6')) is not plan
+    assert set(extraction._plans) == {'5', '6'}
+
+
+def test_fields_added_after_sampling_are_routed_to_extra(capsys):
+    for i in range(SAMPLE_MATCHES):
+        decode_match(make_match_data(match_id=f'NA1_{i}'))
+    plan = get_plan(make_match_data())
+    capsys.readouterr()
+
+    match = decode_match(make_match_data(participant_extra={'augments': ['Cutthroat']}))
+
+    assert match.participants[0].extra == {'augments': ['Cutthroat']}
+    assert 'new participant fields routed to extra' in capsys.readouterr().out
+    assert plan.samples == SAMPLE_MATCHES + 1
+
+
+def test_matches_with_known_key_counts_are_not_sampled_again():
+    for i in range(SAMPLE_MATCHES):
+        decode_match(make_match_data(match_id=f'NA1_{i}'))
+    plan = get_plan(make_match_data())
+
+    assert plan.check(make_match_data()) is False
+    # A unit missing optional fields has a new key count, so it is checked once, then known.
+    assert plan.check(make_match_data(unit={'character_id': 'TFT5_Lux', 'tier': 3})) is True
+    assert plan.check(make_match_data(unit={'character_id': 'TFT5_Lux', 'tier': 3})) is False
+    assert plan.samples == SAMPLE_MATCHES + 1
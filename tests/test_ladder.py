@@ -0,0 +1,100 @@
+import psycopg2
+import pytest
+
+import ladder
+from ladder import LadderTracker, top_summoner_ids
+
+
+def make_league(*entries):
+    return {
+        'tier': 'CHALLENGER',
+        'entries': [
+            {'summonerId': summoner_id, 'summonerName': summoner_id, 'rank': 'I', 'leaguePoints': lp, 'wins': wins, 'losses': losses}
+            for summoner_id, lp, wins, losses in entries
+        ]
+    }
+
+
+class FakeCursor(object):
+    """Serves latest_snapshots from a dict and records inserted rows."""
+
+    def __init__(self, snapshots):
+        self.snapshots = snapshots
+        self.lookups = []
+        self.inserted = []
+        self._rows = []
+
+    def execute(self, query, params=None):
+        summoner_ids, region = params
+        self.lookups.append(list(summoner_ids))
+        self._rows = [(s,) + self.snapshots[s] for s in summoner_ids if s in self.snapshots]
+
+    def fetchall(self):
+        return self._rows
+
+
+@pytest.fixture
+def cursor(monkeypatch, fake_db):
+    cur = fake_db(ladder, FakeCursor({}))
+
+    def execute_values(cur, query, rows, page_size=100):
+        cur.inserted.append([row[1] for row in rows])
+
+    monkeypatch.setattr(ladder, 'ensure_table', lambda cur, table: False)
+    monkeypatch.setattr(ladder.psycopg2.extras, 'execute_values', execute_values)
+    return cur
+
+
+def test_top_summoner_ids_orders_by_lp():
+    league = make_league(('a', 500, 0, 0), ('b', 900, 0, 0), ('c', 700, 0, 0), ('d', 100, 0, 0))
+
+    assert top_summoner_ids(league, 2) == ['b', 'c']
+    assert top_summoner_ids(league, 10) == ['b', 'c', 'a', 'd']
+
+
+def test_record_writes_only_changed_entries(cursor):
+    tracker = LadderTracker('NA1')
+
+    assert len(tracker.record(make_league(('a', 500, 10, 5), ('b', 900, 20, 5)))) == 2
+    changed = tracker.record(make_league(('a', 500, 10, 5), ('b', 950, 21, 5)))
+
+    assert [entry['summonerId'] for entry in changed] == ['b']
+    assert cursor.inserted == [['a', 'b'], ['b']]
+
+
+def test_record_looks_up_only_summoners_not_in_memory(cursor):
+    cursor.snapshots = {'a': (500, 10, 5)}
+    tracker = LadderTracker('NA1')
+
+    changed = tracker.record(make_league(('a', 500, 10, 5), ('b', 900, 20, 5)))
+    assert [entry['summonerId'] for entry in changed] == ['b']
+
+    tracker.record(make_league(('a', 500, 10, 5), ('b', 900, 20, 5), ('c', 300, 1, 1)))
+    assert cursor.lookups == [['a', 'b'], ['c']]
+
+
+def test_record_reload_compares_against_db(cursor):
+    tracker = LadderTracker('NA1')
+    tracker.record(make_league(('a', 500, 10, 5)))
+
+    # Another worker wrote a newer snapshot for a.
+    cursor.snapshots = {'a': (600, 11, 5)}
+    changed = tracker.record(make_league(('a', 500, 10, 5)), reload=True)
+
+    assert [entry['summonerId'] for entry in changed] == ['a']
+    assert cursor.lookups[-1] == ['a']
+
+
+def test_record_db_error_keeps_previous_state(cursor, monkeypatch):
+    tracker = LadderTracker('NA1')
+    tracker.record(make_league(('a', 500, 10, 5)))
+
+    def fail(cur, query, rows, page_size=100):
+        raise psycopg2.OperationalError('connection lost')
+
+    monkeypatch.setattr(ladder.psycopg2.extras, 'execute_values', fail)
+    assert tracker.record(make_league(('a', 550, 11, 5))) == []
+
+    monkeypatch.setattr(ladder.psycopg2.extras, 'execute_values', lambda cur, query, rows, page_size=100: None)
+    changed = tracker.record(make_league(('a', 550, 11, 5)))
+    assert [entry['summonerId'] for entry in changed] == ['a']
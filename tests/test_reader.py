@@ -0,0 +1,122 @@
+from collections import namedtuple
+from contextlib import contextmanager
+
+import pandas as pd
+import pytest
+
+import reader
+from reader import _slice_query, decode_chunk, iter_chunks
+
+Column = namedtuple('Column', ['name'])
+
+
+class FakeConnection(object):
+
+    def __init__(self, named):
+        self.named = named
+
+    @contextmanager
+    def cursor(self):
+        yield FakeCategoryCursor(self.named)
+
+
+class FakeCategoryCursor(object):
+    """A client-side cursor on the reader connection serving the distinct categorical values."""
+
+    def __init__(self, named):
+        self.named = named
+
+    def execute(self, query, params=None):
+        self.named.log.append(('categories', repr(query), params))
+
+    def fetchall(self):
+        return self.named.distinct
+
+
+class FakeNamedCursor(object):
+    """A server-side cursor serving rows in fetchmany batches."""
+
+    def __init__(self, columns, rows, distinct):
+        self.description = [Column(column) for column in columns]
+        self.rows = list(rows)
+        self.distinct = distinct
+        self.log = []
+        self.connection = FakeConnection(self)
+
+    def execute(self, query, params=None):
+        self.log.append(('rows', repr(query), params))
+
+    def fetchmany(self, size):
+        batch, self.rows = self.rows[:size], self.rows[size:]
+        return batch
+
+
+def test_slice_query_rejects_unknown_table():
+    with pytest.raises(ValueError):
+        _slice_query('pg_user')
+
+
+def test_slice_query_without_filters_has_no_params():
+    query, params = _slice_query('player_units')
+
+    assert params == []
+    assert 'WHERE' not in repr(query)
+
+
+def test_slice_query_match_data_filters_on_own_columns():
+    query, params = _slice_query('match_data', patch='11.19', puuid='a')
+
+    assert params == ['Version 11.19.%', ['a']]
+    assert 'game_version LIKE' in repr(query)
+    assert 'participants &&' in repr(query)
+    assert 'SELECT match_id FROM match_data' not in repr(query)
+
+
+def test_slice_query_player_tables_filter_through_match_data():
+    query, params = _slice_query('player_traits', patch='11.19', puuid=('a', 'b'), match_id='NA1_1')
+
+    assert params == ['Version 11.19.%', ['a', 'b'], ['NA1_1']]
+    assert 'SELECT match_id FROM match_data WHERE game_version LIKE' in repr(query)
+    assert 'puuid = ANY' in repr(query)
+    assert 'match_id = ANY' in repr(query)
+
+
+def test_decode_chunk_parses_varchar_numerics():
+    df = decode_chunk(pd.DataFrame({'character_id': ['TFT5_Garen'], 'tier': ['2.0']}), 'player_units')
+
+    assert df['tier'].dtype == 'Int64'
+    assert df['tier'][0] == 2
+
+
+def test_decode_chunk_shared_categories_survive_concat():
+    dtype = pd.CategoricalDtype(['TFT5_Garen', 'TFT5_Lux'])
+    chunks = [
+        decode_chunk(pd.DataFrame({'character_id': ['TFT5_Garen'], 'tier': ['1']}), 'player_units', {'character_id': dtype}),
+        decode_chunk(pd.DataFrame({'character_id': ['TFT5_Lux'], 'tier': ['None']}), 'player_units', {'character_id': dtype}),
+    ]
+
+    df = pd.concat(chunks, ignore_index=True)
+
+    assert df['character_id'].dtype == dtype
+    assert df['tier'].isna().tolist() == [False, True]
+
+
+def test_iter_chunks_reads_categories_and_rows_in_one_snapshot(fake_db):
+    cur = fake_db(reader, FakeNamedCursor(
+        ['match_id', 'character_id', 'tier'],
+        [('NA1_1', 'TFT5_Garen', '2'), ('NA1_1', 'TFT5_Lux', '1'), ('NA1_2', 'TFT5_Lux', '3')],
+        distinct=[('TFT5_Lux',), ('TFT5_Garen',), (None,)]
+    ))
+
+    chunks = list(iter_chunks('player_units', ['match_id', 'character_id', 'tier'], patch='11.19', chunk_size=2))
+
+    assert fake_db.opened[0]['isolation_level'] == 'REPEATABLE READ'
+    assert [step for step, query, params in cur.log] == ['categories', 'rows']
+    assert 'SELECT DISTINCT * FROM' in cur.log[0][1]
+    assert cur.log[0][2] == cur.log[1][2] == ['Version 11.19.%']
+
+    df = pd.concat(chunks, ignore_index=True)
+    assert list(map(len, chunks)) == [2, 1]
+    assert list(df['character_id'].dtype.categories) == ['TFT5_Garen', 'TFT5_Lux']
+    assert df['character_id'].tolist() == ['TFT5_Garen', 'TFT5_Lux', 'TFT5_Lux']
+    assert df['tier'].tolist() == [2, 1, 3]
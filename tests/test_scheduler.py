@@ -0,0 +1,154 @@
+import pytest
+
+import scheduler
+from scheduler import RateLimiter, MicroBatcher
+
+
+class FakeClock(object):
+    """Stands in for time.monotonic / time.sleep / time.time so pacing is tested without waiting."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(scheduler.time, 'monotonic', fake.monotonic)
+    monkeypatch.setattr(scheduler.time, 'sleep', fake.sleep)
+    monkeypatch.setattr(scheduler.time, 'time', fake.time)
+    return fake
+
+
+def test_rate_limiter_interval_is_tightest_sustained_rate():
+    assert RateLimiter().interval == pytest.approx(1.2)
+    assert RateLimiter(((10, 1.0),)).interval == pytest.approx(0.1)
+
+
+def test_rate_limiter_spaces_requests_evenly(clock):
+    limiter = RateLimiter()
+    start = clock.now
+
+    for _ in range(5):
+        limiter.acquire()
+
+    assert clock.now - start == pytest.approx(4 * 1.2)
+    assert all(seconds == pytest.approx(1.2) for seconds in clock.sleeps)
+
+
+def test_rate_limiter_never_exceeds_window(clock):
+    # Pacing alone allows 1 / 0.1s, the window caps it at 3 per second.
+    limiter = RateLimiter(((3, 1.0), (10, 1.0)))
+    times = []
+
+    for _ in range(7):
+        limiter.acquire()
+        times.append(clock.now)
+
+    for i in range(len(times) - 3):
+        assert times[i + 3] - times[i] >= 1.0 - 1e-9
+
+
+def test_rate_limiter_does_not_wait_after_idle(clock):
+    limiter = RateLimiter()
+    limiter.acquire()
+    clock.now += 60.0
+
+    limiter.acquire()
+
+    assert clock.sleeps == []
+
+
+def test_micro_batcher_flushes_on_row_count(clock, make_match):
+    loaded = []
+    # 1 match row + 2 participants * (2 + 3 units + 2 traits) = 15 rows per match.
+    batcher = MicroBatcher(loaded.append, max_rows=30, max_seconds=1000.0)
+
+    batcher.add(make_match('NA1_1'))
+    assert not batcher.due()
+    batcher.add(make_match('NA1_2'))
+    assert batcher.due()
+
+    assert batcher.flush() == ['NA1_1', 'NA1_2']
+    assert list(loaded[0]) == ['NA1_1', 'NA1_2']
+    assert len(batcher) == 0
+    assert not batcher.due()
+
+
+def test_micro_batcher_flushes_on_age(clock, make_match):
+    batcher = MicroBatcher(lambda matches: None, max_rows=10000, max_seconds=60.0)
+
+    batcher.add(make_match('NA1_1'))
+    clock.now += 59.0
+    assert not batcher.due()
+    clock.now += 1.0
+    assert batcher.due()
+
+
+def test_micro_batcher_empty_flush_is_noop(clock):
+    loaded = []
+    batcher = MicroBatcher(loaded.append)
+
+    assert batcher.flush() == []
+    assert loaded == []
+
+
+class TransientError(Exception):
+    pass
+
+
+def test_micro_batcher_failed_flush_keeps_buffer(clock, make_match):
+    def fail(matches):
+        raise TransientError('connection lost')
+
+    batcher = MicroBatcher(fail, max_rows=1)
+    batcher.add(make_match('NA1_1'))
+
+    with pytest.raises(TransientError):
+        batcher.flush()
+
+    assert len(batcher) == 1
+
+
+def test_micro_batcher_try_flush_backs_off_then_retries(clock, make_match):
+    calls = []
+
+    def flaky(matches):
+        calls.append(list(matches))
+        if len(calls) == 1:
+            raise TransientError('connection lost')
+
+    batcher = MicroBatcher(flaky, max_rows=1, retry_seconds=30.0)
+    batcher.add(make_match('NA1_1'))
+
+    assert batcher.try_flush((TransientError,)) is False
+    assert len(batcher) == 1
+    assert not batcher.due()
+
+    clock.now += 30.0
+    assert batcher.due()
+    assert batcher.try_flush((TransientError,)) is True
+    assert len(batcher) == 0
+    assert calls == [['NA1_1'], ['NA1_1']]
+
+
+def test_micro_batcher_try_flush_propagates_other_errors(clock, make_match):
+    def broken(matches):
+        raise ValueError('bug')
+
+    batcher = MicroBatcher(broken, max_rows=1)
+    batcher.add(make_match('NA1_1'))
+
+    with pytest.raises(ValueError):
+        batcher.try_flush((TransientError,))
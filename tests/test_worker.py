@@ -0,0 +1,197 @@
+import threading
+
+import pytest
+from requests.exceptions import ConnectionError
+
+import worker
+from worker import enqueue, claim, release, unclaim, run_worker
+
+
+class RecordingCursor(object):
+    """Records executed queries with whitespace collapsed, and returns scripted rows."""
+
+    def __init__(self, rows=()):
+        self.executed = []
+        self.rows = list(rows)
+
+    def execute(self, query, params=None):
+        self.executed.append((' '.join(query.split()), params))
+
+    def fetchall(self):
+        return self.rows
+
+
+def test_enqueue_ignores_queued_items(monkeypatch):
+    calls = []
+    monkeypatch.setattr(worker.psycopg2.extras, 'execute_values', lambda cur, query, rows: calls.append((' '.join(query.split()), rows)))
+
+    enqueue(RecordingCursor(), 'match', ['NA1_1', 'NA1_2'])
+    enqueue(RecordingCursor(), 'match', [])
+
+    assert calls == [('INSERT INTO crawl_queue (kind, item_id) VALUES %s ON CONFLICT DO NOTHING', [('match', 'NA1_1'), ('match', 'NA1_2')])]
+
+
+def test_enqueue_revive_failed_resets_only_failed_items(monkeypatch):
+    calls = []
+    monkeypatch.setattr(worker.psycopg2.extras, 'execute_values', lambda cur, query, rows: calls.append(' '.join(query.split())))
+
+    enqueue(RecordingCursor(), 'ladder', ['NA1'], revive_failed=True)
+
+    assert "ON CONFLICT (kind, item_id) DO UPDATE SET status = 'pending'" in calls[0]
+    assert "WHERE crawl_queue.status = 'failed'" in calls[0]
+
+
+def test_claim_fails_exhausted_expired_leases_then_skips_locked_rows():
+    cur = RecordingCursor(rows=[('match', 'NA1_1')])
+
+    assert claim(cur, 'host:1', n=3, lease_seconds=60.0, max_attempts=4) == [('match', 'NA1_1')]
+
+    (fail_query, fail_params), (claim_query, claim_params) = cur.executed
+    assert "SET status = 'failed'" in fail_query
+    assert "WHERE status = 'leased' AND lease_expires_at < now() AND attempts >= %(max_attempts)s" in fail_query
+    assert 'NOT kind = ANY(%(recurring_kinds)s)' in fail_query
+    assert fail_params == {'max_attempts': 4, 'recurring_kinds': ['ladder', 'player']}
+
+    assert "WHERE (status = 'pending' AND available_at <= now()) OR (status = 'leased' AND lease_expires_at < now())" in claim_query
+    assert "ORDER BY kind = 'match' DESC, available_at LIMIT %(n)s FOR UPDATE SKIP LOCKED" in claim_query
+    assert 'attempts = q.attempts + 1' in claim_query
+    assert claim_params == {'worker_id': 'host:1', 'lease_seconds': 60.0, 'n': 3}
+
+
+def test_release_never_fails_recurring_items():
+    cur = RecordingCursor()
+
+    release(cur, 'host:1', 'ladder', ['NA1'], requeue_seconds=600.0)
+    release(cur, 'host:1', 'match', [])
+
+    query, params = cur.executed[0]
+    assert len(cur.executed) == 1
+    assert "CASE WHEN %(requeue_seconds)s IS NULL AND attempts >= %(max_attempts)s THEN 'failed' ELSE 'pending' END" in query
+    assert 'least(%(backoff_seconds)s * power(2, greatest(attempts - 1, 0)), %(max_backoff_seconds)s)' in query
+    assert params['requeue_seconds'] == 600.0
+
+
+def test_unclaim_does_not_count_the_attempt():
+    cur = RecordingCursor()
+
+    unclaim(cur, 'host:1', 'player', ['a'])
+
+    query, params = cur.executed[0]
+    assert "SET status = 'pending'" in query
+    assert 'attempts = greatest(attempts - 1, 0)' in query
+    assert params == {'worker_id': 'host:1', 'kind': 'player', 'item_ids': ['a']}
+
+
+class Queue(object):
+    """Stands in for the crawl_queue functions of worker, recording every call."""
+
+    def __init__(self, batches, stop):
+        self.batches = list(batches)
+        self.stop = stop
+        self.calls = []
+
+    def claim(self, cur, worker_id, n, lease_seconds, max_attempts):
+        if not self.batches:
+            self.stop.set()
+            return []
+        return list(self.batches.pop(0))
+
+    def record(self, name):
+        def call(cur, worker_id, kind, item_ids, **kwargs):
+            self.calls.append((name, kind, list(item_ids), kwargs))
+        return call
+
+
+@pytest.fixture
+def run(monkeypatch, fake_db, make_match):
+    """Runs run_worker over scripted claims with the Riot API, DB and load stubbed out."""
+
+    stop = threading.Event()
+    loaded = []
+    enqueued = []
+
+    def start(batches, fetch_match=None, poll_match_ids=None, load_matches=None):
+        queue = Queue(batches, stop)
+        fake_db(worker, RecordingCursor())
+        monkeypatch.setattr(worker, 'install_stop_event', lambda: stop)
+        monkeypatch.setattr(worker, 'TftWatcher', lambda api_key: None)
+        monkeypatch.setattr(worker, 'get_api_key', lambda env_var: 'key')
+        monkeypatch.setattr(worker, 'get_tracked_puuids', lambda: [])
+        monkeypatch.setattr(worker, 'ensure_table', lambda cur, table: False)
+        monkeypatch.setattr(worker, 'enqueue', lambda cur, kind, item_ids, revive_failed=False: enqueued.append((kind, list(item_ids), revive_failed)))
+        monkeypatch.setattr(worker, 'claim', queue.claim)
+        monkeypatch.setattr(worker, 'complete', queue.record('complete'))
+        monkeypatch.setattr(worker, 'release', queue.record('release'))
+        monkeypatch.setattr(worker, 'unclaim', queue.record('unclaim'))
+        monkeypatch.setattr(worker, 'load_matches', load_matches or (lambda matches: loaded.append(list(matches))))
+        monkeypatch.setattr(worker, 'poll_ladder', lambda watcher, limiter, n_players, region1, reload_ladder: ['s1'])
+        monkeypatch.setattr(worker, 'get_player_puuid', lambda watcher, limiter, summonerId, region1: 'p1')
+        monkeypatch.setattr(worker, 'poll_match_ids', poll_match_ids or (lambda watcher, limiter, puuid, n_matches: ['NA1_1']))
+        monkeypatch.setattr(worker, 'fetch_match', fetch_match or (lambda watcher, limiter, match_id: make_match(match_id)))
+
+        run_worker(seed_seconds=600.0, player_seconds=300.0)
+        return queue.calls, enqueued, loaded
+
+    return start
+
+
+def test_run_worker_dispatches_each_kind(run):
+    calls, enqueued, loaded = run([[('ladder', 'NA1'), ('summoner', 's1'), ('player', 'p1'), ('match', 'NA1_1')]])
+
+    assert enqueued == [
+        ('ladder', ['NA1'], True), ('player', [], True),
+        ('summoner', ['s1'], False), ('player', ['p1'], False), ('match', ['NA1_1'], False),
+    ]
+    assert calls == [
+        ('complete', 'ladder', ['NA1'], {'requeue_seconds': 600.0}),
+        ('complete', 'summoner', ['s1'], {}),
+        ('complete', 'player', ['p1'], {'requeue_seconds': 300.0}),
+        # The buffered match is loaded and completed on the final drain.
+        ('complete', 'match', ['NA1_1'], {}),
+    ]
+    assert loaded == [['NA1_1']]
+
+
+def test_run_worker_releases_failed_items_and_keeps_running(run):
+    def fetch_match(watcher, limiter, match_id):
+        raise KeyError('info')
+
+    def poll_match_ids(watcher, limiter, puuid, n_matches):
+        raise ConnectionError('connection reset')
+
+    calls, enqueued, loaded = run(
+        [[('match', 'NA1_1'), ('player', 'p1')], [('summoner', 's1')]],
+        fetch_match=fetch_match, poll_match_ids=poll_match_ids
+    )
+
+    assert calls == [
+        ('release', 'match', ['NA1_1'], {'max_attempts': 5, 'requeue_seconds': None}),
+        ('release', 'player', ['p1'], {'max_attempts': 5, 'requeue_seconds': 300.0}),
+        ('complete', 'summoner', ['s1'], {}),
+    ]
+    assert loaded == []
+
+
+def test_run_worker_unclaims_unprocessed_items_on_shutdown(run, make_match):
+    def fetch_match(watcher, limiter, match_id):
+        # SIGTERM arrives while the first item is in flight.
+        worker.install_stop_event().set()
+        return make_match(match_id)
+
+    calls, enqueued, loaded = run([[('match', 'NA1_1'), ('match', 'NA1_2'), ('player', 'p1')]], fetch_match=fetch_match)
+
+    assert calls == [
+        ('complete', 'match', ['NA1_1'], {}),
+        ('unclaim', 'match', ['NA1_2'], {}),
+        ('unclaim', 'player', ['p1'], {}),
+    ]
+    assert loaded == [['NA1_1']]
+
+
+def test_run_worker_releases_matches_that_fail_to_load(run):
+    def load_matches(matches):
+        raise TypeError('unsupported operand')
+
+    calls, enqueued, loaded = run([[('match', 'NA1_1')]], load_matches=load_matches)
+
+    assert calls == [('release', 'match', ['NA1_1'], {'max_attempts': 5, 'requeue_seconds': None})]
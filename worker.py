@@ -0,0 +1,389 @@
+"""Crawl Worker
+
+This file contains a worker mode that coordinates any number of crawl processes through the crawl_queue table.
+
+* Work items are (kind, item_id) rows in crawl_queue:
+    - ladder: a region whose challenger ladder is polled, recorded to ladder_entries and enqueueing summoners. Requeued every seed_seconds.
+    - summoner: a summonerId resolved to a puuid, enqueueing a player.
+    - player: a puuid whose recent match_id's are polled, enqueueing matches. Requeued every player_seconds.
+    - match: a match_id fetched and loaded. Marked done once loaded, so no match is fetched twice.
+* Items are claimed with FOR UPDATE SKIP LOCKED, so concurrent workers never block on or claim the same rows.
+* A claim is a lease: items leased by a crashed worker become claimable again once lease_expires_at passes.
+* ladder and player items recur, so they are never failed: failures back them off, capped at max_backoff_seconds.
+  Other items are failed after max_attempts, including items whose processing crashed the worker, so a poison item can't crash every worker in turn.
+* Every worker runs with its own API key and RateLimiter, so throughput scales with keys and workers.
+* Riot API, network and DB errors are logged and retried, or left for the lease to expire, they don't end the worker.
+
+Methods:
+--------
+    * enqueue - Inserts work items, ignoring items already queued.
+    * claim - Leases up to n claimable work items for a worker.
+    * complete - Marks leased work items done, or requeues them after a delay.
+    * release - Returns leased work items to the queue after a failure.
+    * unclaim - Returns leased work items that were never processed to the queue.
+    * run_worker - Claims, processes and loads work items until stopped.
+"""
+
+import argparse
+import os
+import socket
+
+import psycopg2
+import psycopg2.extras
+from riotwatcher import TftWatcher
+
+from db import DB, TABLE_DDL, ensure_table
+from config import get_database_creds, get_api_key, get_tracked_puuids
+from etl import load_matches
+from daemon import LOAD_ERRORS, poll_ladder, get_player_puuid, poll_match_ids, fetch_match
+from scheduler import RateLimiter, MicroBatcher, install_stop_event
+
+# Work item kinds that are requeued after every poll, and so are never failed.
+RECURRING_KINDS = ('ladder', 'player')
+
+def enqueue(cur, kind: str, item_ids: list, revive_failed: bool = False):
+    """Inserts work items, ignoring items already queued.
+
+    Parameters
+    ----------
+    * cur: psycopg2.connect.cursor()
+        A psycopg2 Cursor object.
+    * kind: str
+        The work item kind, one of 'ladder', 'summoner', 'player' or 'match'.
+    * item_ids: list
+        The work item ids.
+    * revive_failed: bool
+        Return items already queued as failed to pending, e.g. for the seed items on startup.
+    """
+
+    if not item_ids:
+        return
+
+    if revive_failed:
+        conflict = """
+            ON CONFLICT (kind, item_id) DO UPDATE
+            SET status = 'pending', available_at = now(), attempts = 0
+            WHERE crawl_queue.status = 'failed'
+            """
+    else:
+        conflict = "ON CONFLICT DO NOTHING"
+
+    psycopg2.extras.execute_values(
+        cur,
+        f"INSERT INTO crawl_queue (kind, item_id) VALUES %s {conflict}",
+        [(kind, item_id) for item_id in item_ids]
+    )
+
+def claim(cur, worker_id: str, n: int = 10, lease_seconds: float = 300.0, max_attempts: int = 5) -> list:
+    """Leases up to n claimable work items for a worker.
+
+    * Pending items that are available, and leased items whose lease has expired, are claimable.
+    * Expired leases already claimed max_attempts times are failed instead, unless the item recurs, since their worker likely crashed on them.
+    * match items are claimed first so fetched data isn't starved by polling.
+
+    Parameters
+    ----------
+    * cur: psycopg2.connect.cursor()
+        A psycopg2 Cursor object.
+    * worker_id: str
+        The claiming worker.
+    * n: int
+        Maximum number of items claimed.
+    * lease_seconds: float
+        Seconds until the lease expires and the items become claimable by other workers.
+    * max_attempts: int
+        Expired leases claimed this many times are marked failed instead of claimed.
+
+    Returns
+    -------
+    * list
+        A list consisting of (kind, item_id) tuples.
+    """
+
+    cur.execute(
+        """
+        UPDATE crawl_queue
+        SET status = 'failed',
+            leased_by = NULL,
+            lease_expires_at = NULL
+        WHERE status = 'leased' AND lease_expires_at < now()
+          AND attempts >= %(max_attempts)s AND NOT kind = ANY(%(recurring_kinds)s)
+        """,
+        {'max_attempts': max_attempts, 'recurring_kinds': list(RECURRING_KINDS)}
+    )
+
+    cur.execute(
+        """
+        UPDATE crawl_queue q
+        SET status = 'leased',
+            leased_by = %(worker_id)s,
+            lease_expires_at = now() + %(lease_seconds)s * interval '1 second',
+            attempts = q.attempts + 1
+        FROM (
+            SELECT kind, item_id
+            FROM crawl_queue
+            WHERE (status = 'pending' AND available_at <= now())
+               OR (status = 'leased' AND lease_expires_at < now())
+            ORDER BY kind = 'match' DESC, available_at
+            LIMIT %(n)s
+            FOR UPDATE SKIP LOCKED
+        ) c
+        WHERE q.kind = c.kind AND q.item_id = c.item_id
+        RETURNING q.kind, q.item_id
+        """,
+        {'worker_id': worker_id, 'lease_seconds': lease_seconds, 'n': n}
+    )
+
+    return cur.fetchall()
+
+def complete(cur, worker_id: str, kind: str, item_ids: list, requeue_seconds: float = None):
+    """Marks leased work items done, or requeues them after a delay.
+
+    Parameters
+    ----------
+    * cur: psycopg2.connect.cursor()
+        A psycopg2 Cursor object.
+    * worker_id: str
+        The worker holding the lease.
+    * kind: str
+        The work item kind.
+    * item_ids: list
+        The work item ids.
+    * requeue_seconds: float
+        Seconds until the items are claimable again, marked done if None.
+    """
+
+    if not item_ids:
+        return
+
+    cur.execute(
+        """
+        UPDATE crawl_queue
+        SET status = CASE WHEN %(requeue_seconds)s IS NULL THEN 'done' ELSE 'pending' END,
+            available_at = now() + coalesce(%(requeue_seconds)s, 0) * interval '1 second',
+            leased_by = NULL,
+            lease_expires_at = NULL,
+            attempts = 0
+        WHERE kind = %(kind)s AND item_id = ANY(%(item_ids)s) AND leased_by = %(worker_id)s
+        """,
+        {'worker_id': worker_id, 'kind': kind, 'item_ids': list(item_ids), 'requeue_seconds': requeue_seconds}
+    )
+
+def release(cur, worker_id: str, kind: str, item_ids: list, backoff_seconds: float = 60.0, max_attempts: int = 5,
+            requeue_seconds: float = None, max_backoff_seconds: float = 3600.0):
+    """Returns leased work items to the queue after a failure.
+
+    * The backoff doubles with every consecutive failed attempt, up to max_backoff_seconds.
+    * Recurring items (requeue_seconds given) are never failed, they are claimable again after requeue_seconds plus the backoff.
+
+    Parameters
+    ----------
+    * cur: psycopg2.connect.cursor()
+        A psycopg2 Cursor object.
+    * worker_id: str
+        The worker holding the lease.
+    * kind: str
+        The work item kind.
+    * item_ids: list
+        The work item ids.
+    * backoff_seconds: float
+        Seconds until the items are claimable again after their first failed attempt.
+    * max_attempts: int
+        Items claimed this many times are marked failed instead of requeued, unless requeue_seconds is given.
+    * requeue_seconds: float
+        Seconds between polls of a recurring item, added to the backoff.
+    * max_backoff_seconds: float
+        Upper bound on the backoff.
+    """
+
+    if not item_ids:
+        return
+
+    cur.execute(
+        """
+        UPDATE crawl_queue
+        SET status = CASE WHEN %(requeue_seconds)s IS NULL AND attempts >= %(max_attempts)s THEN 'failed' ELSE 'pending' END,
+            available_at = now() + (
+                coalesce(%(requeue_seconds)s, 0)
+                + least(%(backoff_seconds)s * power(2, greatest(attempts - 1, 0)), %(max_backoff_seconds)s)
+            ) * interval '1 second',
+            leased_by = NULL,
+            lease_expires_at = NULL
+        WHERE kind = %(kind)s AND item_id = ANY(%(item_ids)s) AND leased_by = %(worker_id)s
+        """,
+        {
+            'worker_id': worker_id, 'kind': kind, 'item_ids': list(item_ids), 'backoff_seconds': backoff_seconds,
+            'max_attempts': max_attempts, 'requeue_seconds': requeue_seconds, 'max_backoff_seconds': max_backoff_seconds
+        }
+    )
+
+def unclaim(cur, worker_id: str, kind: str, item_ids: list):
+    """Returns leased work items that were never processed to the queue, e.g. on shutdown, without counting the claim as an attempt.
+
+    Parameters
+    ----------
+    * cur: psycopg2.connect.cursor()
+        A psycopg2 Cursor object.
+    * worker_id: str
+        The worker holding the lease.
+    * kind: str
+        The work item kind.
+    * item_ids: list
+        The work item ids.
+    """
+
+    if not item_ids:
+        return
+
+    cur.execute(
+        """
+        UPDATE crawl_queue
+        SET status = 'pending',
+            available_at = now(),
+            leased_by = NULL,
+            lease_expires_at = NULL,
+            attempts = greatest(attempts - 1, 0)
+        WHERE kind = %(kind)s AND item_id = ANY(%(item_ids)s) AND leased_by = %(worker_id)s
+        """,
+        {'worker_id': worker_id, 'kind': kind, 'item_ids': list(item_ids)}
+    )
+
+def run_worker(api_key_env: str = 'API_KEY', region1: str = 'NA1', n_players: int = 10, n_matches: int = 9, batch_size: int = 10,
+               lease_seconds: float = 300.0, seed_seconds: float = 600.0, player_seconds: float = 600.0,
+               max_attempts: int = 5, max_rows: int = 5000, max_seconds: float = 120.0):
+    """Claims, processes and loads work items until SIGINT / SIGTERM.
+
+    Parameters
+    ----------
+    * api_key_env: str
+        Environment variable holding this worker's Riot API key.
+    * region1: str
+        Region whose challenger ladder seeds the queue.
+    * n_players: int
+        Number of Challenger players enqueued per ladder poll.
+    * n_matches: int
+        Number of recent match_id's enqueued per player poll.
+    * batch_size: int
+        Maximum number of items claimed at once.
+    * lease_seconds: float
+        Seconds a claim is held before other workers may take it over.
+    * seed_seconds: float
+        Seconds between ladder polls.
+    * player_seconds: float
+        Seconds between polls of the same player.
+    * max_attempts: int
+        Claims of a non recurring item before it is marked failed.
+    * max_rows: int
+        Flush once the buffered matches would write at least this many rows.
+    * max_seconds: float
+        Flush once the oldest buffered match has waited this long, capped below lease_seconds.
+    """
+
+    worker_id = f'{socket.gethostname()}:{os.getpid()}'
+    db = DB(**get_database_creds())
+
+    stop = install_stop_event()
+    requeue = {'ladder': seed_seconds, 'player': player_seconds}
+
+    def _release(kind: str, item_ids: list):
+        try:
+            with db.managed_cursor() as cur:
+                release(cur, worker_id, kind, item_ids, max_attempts=max_attempts, requeue_seconds=requeue.get(kind))
+        except psycopg2.Error as e:
+            print(f"-Releasing {kind} {item_ids} failed, lease left to expire: {e}")
+
+    def _load_and_complete(matches: dict):
+        try:
+            load_matches(matches)
+        except LOAD_ERRORS:
+            raise
+        except Exception as e:
+            # Retrying won't help, so the matches are released and failed once they reach max_attempts.
+            print(f"-Loading {len(matches)} matches failed, releasing them: {e!r}")
+            _release('match', list(matches))
+            return
+        with db.managed_cursor() as cur:
+            complete(cur, worker_id, 'match', list(matches))
+
+    tft_watcher = TftWatcher(api_key=get_api_key(api_key_env))
+    limiter = RateLimiter()
+    # Buffered matches must load before their lease expires or another worker refetches them.
+    batcher = MicroBatcher(_load_and_complete, max_rows=max_rows, max_seconds=min(max_seconds, lease_seconds / 2))
+
+    # Every table is created up front, so concurrent workers on a fresh DB don't race to create them on first flush.
+    with db.managed_cursor() as cur:
+        for table in TABLE_DDL:
+            ensure_table(cur, table)
+        # Seed items that failed in an earlier run would otherwise never be claimed again.
+        enqueue(cur, 'ladder', [region1], revive_failed=True)
+        enqueue(cur, 'player', get_tracked_puuids(), revive_failed=True)
+
+    print(f"Beginning crawl worker {worker_id}.\n")
+
+    claimed = []
+    try:
+        while not stop.is_set():
+            try:
+                with db.managed_cursor() as cur:
+                    claimed = claim(cur, worker_id, batch_size, lease_seconds, max_attempts)
+            except psycopg2.Error as e:
+                print(f"-Claim failed: {e}")
+                claimed = []
+
+            if not claimed:
+                if batcher.due():
+                    batcher.try_flush(LOAD_ERRORS)
+                stop.wait(5.0)
+                continue
+
+            while claimed and not stop.is_set():
+                kind, item_id = claimed[0]
+                try:
+                    if kind == 'ladder':
+                        # Any worker may claim the ladder item, so the previous ladder state is reloaded from DB.
+                        summonerId_list = poll_ladder(tft_watcher, limiter, n_players, region1=item_id, reload_ladder=True)
+                        with db.managed_cursor() as cur:
+                            enqueue(cur, 'summoner', summonerId_list)
+                            complete(cur, worker_id, kind, [item_id], requeue_seconds=seed_seconds)
+                    elif kind == 'summoner':
+                        puuid = get_player_puuid(tft_watcher, limiter, item_id, region1=region1)
+                        with db.managed_cursor() as cur:
+                            enqueue(cur, 'player', [puuid])
+                            complete(cur, worker_id, kind, [item_id])
+                    elif kind == 'player':
+                        match_id_list = poll_match_ids(tft_watcher, limiter, item_id, n_matches)
+                        with db.managed_cursor() as cur:
+                            enqueue(cur, 'match', match_id_list)
+                            complete(cur, worker_id, kind, [item_id], requeue_seconds=player_seconds)
+                    elif kind == 'match':
+                        # Completed by _load_and_complete once loaded.
+                        batcher.add(fetch_match(tft_watcher, limiter, item_id))
+                except psycopg2.Error as e:
+                    print(f"-{kind} {item_id} failed, lease left to expire: {e}")
+                except Exception as e:
+                    # Riot API and network errors, or a malformed response e.g. a KeyError from decode_match.
+                    print(f"-{kind} {item_id} failed: {e!r}")
+                    _release(kind, [item_id])
+                claimed.pop(0)
+
+                if batcher.due():
+                    batcher.try_flush(LOAD_ERRORS)
+    finally:
+        # Guarded so a failed drain can't hide the error that ended the loop, unloaded matches are refetched once their lease expires.
+        if not batcher.try_flush(LOAD_ERRORS):
+            print(f"-{len(batcher)} buffered matches were not loaded.")
+        try:
+            with db.managed_cursor() as cur:
+                for kind, item_id in claimed:
+                    unclaim(cur, worker_id, kind, [item_id])
+        except psycopg2.Error as e:
+            print(f"-Releasing {len(claimed)} claimed items failed, leases left to expire: {e}")
+        print(f"Crawl worker {worker_id} stopped.")
+
+if __name__=='__main__':
+
+    parser = argparse.ArgumentParser(description='Run a crawl worker against the crawl_queue table.')
+    parser.add_argument('--api-key-env', default='API_KEY', help='Environment variable holding this worker\'s Riot API key.')
+    args = parser.parse_args()
+
+    run_worker(api_key_env=args.api_key_env)